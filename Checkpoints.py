@@ -0,0 +1,69 @@
+import os
+import random
+import numpy as np
+
+
+def checkpoint_directory(backwards=False):
+    if backwards:
+        return "Backwards/RewindCheckpoints"
+    return "Forwards/Checkpoints"
+
+
+def checkpoint_file_name(step, backwards=False):
+    return os.path.join(checkpoint_directory(backwards), "checkpoint_%08d.npz" % step)
+
+
+def list_checkpoints(backwards=False):  # Steps of every checkpoint of a run, oldest first.
+    directory = checkpoint_directory(backwards)
+    if not os.path.exists(directory):
+        return []
+    steps = []
+    for name in os.listdir(directory):
+        if name.startswith("checkpoint_") and name.endswith(".npz"):
+            steps.append(int(name[len("checkpoint_"):-len(".npz")]))
+    return sorted(steps)
+
+
+def save_checkpoint(file_name, arrays):  # Written to a temporary file first, then renamed over the checkpoint in one
+    directory = os.path.dirname(file_name)  # step, so a run stopped part way through never leaves a broken file.
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    temporary = file_name + ".tmp"
+    file = open(temporary, "wb")
+    np.savez(file, **arrays)
+    file.flush()
+    os.fsync(file.fileno())
+    file.close()
+    os.replace(temporary, file_name)
+
+
+def load_checkpoint(file_name):
+    data = np.load(file_name)
+    arrays = {name: data[name] for name in data.files}
+    data.close()
+    return arrays
+
+
+def prune_checkpoints(keep, backwards=False):  # Deletes all but the newest keep checkpoints, or none if keep is 0.
+    if keep <= 0:
+        return
+    for step in list_checkpoints(backwards)[:-keep]:
+        os.remove(checkpoint_file_name(step, backwards))
+
+
+def random_states():  # States of the python and numpy random number generators, as plain arrays.
+    version, internal, gauss = random.getstate()
+    kind, keys, position, has_gauss, cached = np.random.get_state()
+    return {'py_random_version': np.array(version), 'py_random_state': np.array(internal, dtype=np.uint64),
+            'py_random_gauss': np.array(np.nan if gauss is None else gauss),
+            'np_random_keys': keys, 'np_random_position': np.array(position),
+            'np_random_gauss': np.array([has_gauss, cached])}
+
+
+def set_random_states(arrays):
+    gauss = float(arrays['py_random_gauss'])
+    random.setstate((int(arrays['py_random_version']), tuple(int(x) for x in arrays['py_random_state']),
+                     None if np.isnan(gauss) else gauss))
+    has_gauss, cached = arrays['np_random_gauss']
+    np.random.set_state(('MT19937', arrays['np_random_keys'], int(arrays['np_random_position']), int(has_gauss),
+                         float(cached)))
@@ -0,0 +1,69 @@
+import numpy as np
+
+
+class ComponentIndex:  # Particles of every type code, found once so each component is looked up directly.
+    def __init__(self, type_codes, n_types):
+        order = np.argsort(type_codes, kind='stable')
+        bounds = np.searchsorted(type_codes[order], np.arange(n_types + 1))
+        self.members = [order[bounds[code]:bounds[code + 1]] for code in range(n_types)]  # Sorted particle numbers.
+
+        self.slices = []  # Slice covering each component, when its particles sit next to each other.
+        for members in self.members:
+            if len(members) > 0 and members[-1] - members[0] + 1 == len(members):
+                self.slices.append(slice(int(members[0]), int(members[-1]) + 1))
+            else:
+                self.slices.append(None)
+
+    def component(self, code):  # A slice if the component is contiguous, otherwise its particle numbers.
+        if self.slices[code] is not None:
+            return self.slices[code]
+        return self.members[code]
+
+    def first(self, code):  # First particle of a component, or None if it has none.
+        if len(self.members[code]) == 0:
+            return None
+        return int(self.members[code][0])
+
+
+class ComponentTable:  # Component lookups of anything with type, type_names and type_colours.
+    def codes(self, names):  # Type codes of the given names, leaving out names not in the table.
+        return [self.type_names.index(name) for name in names if name in self.type_names]
+
+    def components(self):  # Index of the current type codes, made again whenever they change.
+        if self.component_index is None:
+            self.component_index = ComponentIndex(np.asarray(self.type), len(self.type_names))
+        return self.component_index
+
+    def index_components(self):  # Forgets the index, after the type codes have been changed.
+        self.component_index = None
+
+    def members(self, names):  # Sorted particle numbers of every particle with one of the given names.
+        index = self.components()
+        groups = [index.members[code] for code in self.codes(names)]
+        if len(groups) == 0:
+            return np.arange(0)
+        return np.sort(np.concatenate(groups))
+
+    def component(self, name):  # Slice or particle numbers of all particles with the given name.
+        codes = self.codes([name])
+        if len(codes) == 0:
+            return np.arange(0)
+        return self.components().component(codes[0])
+
+    def type_mask(self, names):  # Boolean mask of all particles with one of the given names.
+        mask = np.zeros(len(self.type), dtype=bool)
+        mask[self.members(names)] = True
+        return mask
+
+    def index_of(self, name):  # Position of the first particle with the given name, or 0 if there is none.
+        codes = self.codes([name])
+        if len(codes) == 0:
+            return 0
+        first = self.components().first(codes[0])
+        return 0 if first is None else first
+
+    def name(self, i):
+        return self.type_names[self.type[i]]
+
+    def colour(self, i):
+        return self.type_colours[self.type[i]]
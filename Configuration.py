@@ -0,0 +1,134 @@
+import ast
+import copy
+import json
+import re
+import IntData
+from IntData import option_defaults, derive_options, constants
+
+
+class SimulationConfig:  # Every option of one simulation, starting from IntData, with the values worked out from them.
+    def __init__(self, **options):
+        self.options = copy.deepcopy(option_defaults)  # Options as set, before any values are worked out from them.
+        self.update(**options)
+
+    def update(self, **options):  # Changes some options, then works out the values that follow from them again.
+        for name, value in options.items():
+            if name not in option_defaults:
+                raise KeyError("%s is not a simulation option." % name)
+            self.options[name] = value
+
+        self.__dict__.update(copy.deepcopy(self.options))
+        derive_options(self)
+        return self
+
+    def copy(self, **options):  # A new config with the same options, apart from the given ones.
+        return SimulationConfig(**self.options).update(**options)
+
+    def changes(self):  # Options that differ from IntData, e.g. to tell the runs of a sweep apart.
+        return {name: value for name, value in self.options.items() if value != option_defaults[name]}
+
+    def values(self):  # Every option and worked out value, by name, as NBody reads them.
+        return {name: value for name, value in self.__dict__.items() if name != 'options'}
+
+    @classmethod
+    def from_file(cls, file_name):  # A .json file of option values, or a python file of assignments to options.
+        if file_name.endswith(".json"):
+            file = open(file_name, "r")
+            options = json.load(file)
+            file.close()
+            return cls(**options)
+
+        file = open(file_name, "r")
+        text = file.read()
+        file.close()
+        namespace = {name: getattr(IntData, name) for name in constants}  # So values can be written as 3 * Gyr.
+        namespace.update(copy.deepcopy(option_defaults))
+        exec(compile(text, file_name, "exec"), namespace)
+
+        unknown = [name for name in namespace if name not in namespace_names() and not name.startswith('__')]
+        if len(unknown) > 0:
+            raise KeyError("%s sets unknown options: %s." % (file_name, ", ".join(unknown)))
+        return cls(**{name: namespace[name] for name in option_defaults})
+
+    @classmethod
+    def from_arguments(cls, arguments):  # Options from a command line: "--config file" and "name=value" pairs, in
+        config = cls()  # that order of precedence. Other arguments, such as --resume, are left for the caller.
+        options = {}
+        i = 0
+        while i < len(arguments):
+            if arguments[i] == "--config":
+                if i + 1 == len(arguments):
+                    raise ValueError("--config has to be followed by the name of a config file.")
+                config = cls.from_file(arguments[i + 1])
+                i += 1
+            elif "=" in arguments[i] and not arguments[i].startswith("-"):
+                name, text = arguments[i].split("=", 1)
+                options[name] = parse_value(name, text)
+            elif not arguments[i].startswith("--") or "=" in arguments[i]:
+                raise ValueError("%s is neither a name=value option nor a --flag." % arguments[i])
+            i += 1
+        return config.update(**options)
+
+
+def namespace_names():  # Names a config file may assign to.
+    return set(constants) | set(option_defaults)
+
+
+def parse_value(name, text):  # Value of one command line option, read as the type of the option's value in IntData.
+    if name not in option_defaults:  # Numbers may be products and quotients of numbers and the constants, e.g.
+        raise KeyError("%s is not a simulation option." % name)  # time_run=3*Gyr, and strings are taken as written.
+    default = option_defaults[name]
+
+    if isinstance(default, bool):  # Before numbers, as a bool is also an int.
+        value = literal(text)
+        if not isinstance(value, bool):
+            raise ValueError("%s has to be True or False, not %s." % (name, text))
+        return value
+
+    if isinstance(default, (int, float)):
+        value = parse_number(text)
+        if value is None:
+            raise ValueError("%s has to be a number, or a product of numbers and constants such as Gyr, not %s." %
+                             (name, text))
+        if isinstance(default, int) and float(value).is_integer():  # E.g. pri_dmh_particles=1e5.
+            return int(value)
+        return value
+
+    if isinstance(default, (list, tuple)):
+        value = literal(text)
+        if not isinstance(value, (list, tuple)) or len(value) != len(default) or not all(map(is_number, value)):
+            raise ValueError("%s has to be a list of %d numbers, not %s." % (name, len(default), text))
+        return type(default)(value)
+
+    value = literal(text)  # A string, as written unless it is quoted, e.g. gravity_solver=tree.
+    return value if isinstance(value, str) else text
+
+
+def parse_number(text):  # Number written as a product and quotient of numbers and the constants, or None if it is not.
+    parts = re.split(r"([*/])", text)
+    value = None
+    for i in range(0, len(parts), 2):
+        operand = parts[i].strip()
+        number = getattr(IntData, operand) if operand in constants else literal(operand)
+        if not is_number(number):
+            return None
+        if i == 0:
+            value = number
+        elif parts[i - 1] == "*":
+            value = value * number
+        elif number == 0:
+            return None
+        else:
+            value = value / number
+    return value
+
+
+def literal(text):  # Python literal written in text, or None if it is not one.
+    try:
+        return ast.literal_eval(text.strip())
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return None
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
@@ -8,8 +8,10 @@ import os
 from mpl_toolkits.mplot3d import Axes3D
 from scipy.optimize import curve_fit
 from IntData import *
+from Snapshots import read_image
+
+galaxies = {}  # Position of each galaxy centre in the frame read in.
 
-pri_names = []
 pri_x = []
 pri_y = []
 pri_z = []
@@ -17,7 +19,6 @@ pri_vx = []
 pri_vy = []
 pri_vz = []
 
-sec_names = []
 sec_x = []
 sec_y = []
 sec_z = []
@@ -33,35 +34,21 @@ sec_v = []
 
 
 def file_read():  # Reads information about the path of the galaxies in the interaction.
-    file = open("Forwards/image_1.50000.txt", "r")
-    for line in file:  # Goes through file line by line.
-        data = line.strip().split()
-        if data[0] == pri_galaxy_name or pri_disk_name:
-            pri_names.append(data[0])
-            pri_x.append(float(data[2]))
-            pri_y.append(float(data[3]))
-            pri_z.append(float(data[4]))
-            pri_vx.append(float(data[5]))
-            pri_vy.append(float(data[6]))
-            pri_vz.append(float(data[7]))
-        if data[0] == sec_galaxy_name or sec_disk_name:
-            sec_names.append(data[0])
-            sec_x.append(float(data[2]))
-            sec_y.append(float(data[3]))
-            sec_z.append(float(data[4]))
-            sec_vx.append(float(data[5]))
-            sec_vy.append(float(data[6]))
-            sec_vz.append(float(data[7]))
-    file.close()
-
-
-def find_galaxy(galaxy_name, names):  # Finds position of a galaxy in the list of bodies.
-    position = 0
-    for i in range(len(names)):
-        if names[i] == galaxy_name:
-            position = i
-            break
-    return position
+    frame = read_image(1.5, Gyr, False, snapshot_format)
+
+    galaxies.update({name: frame.index_of(name) for name in (pri_galaxy_name, sec_galaxy_name)})
+    for x, y, z, vx, vy, vz in [(pri_x, pri_y, pri_z, pri_vx, pri_vy, pri_vz),
+                                (sec_x, sec_y, sec_z, sec_vx, sec_vy, sec_vz)]:
+        x.extend(frame.pos[:, 0].tolist())
+        y.extend(frame.pos[:, 1].tolist())
+        z.extend(frame.pos[:, 2].tolist())
+        vx.extend(frame.vel[:, 0].tolist())
+        vy.extend(frame.vel[:, 1].tolist())
+        vz.extend(frame.vel[:, 2].tolist())
+
+
+def find_galaxy(galaxy_name):  # Position of a galaxy, from the type codes of the frame read in.
+    return galaxies.get(galaxy_name, 0)
 
 
 def get_vector_magnitude(v):
@@ -99,7 +86,7 @@ def get_radial_velocity(uxyz, dxyz, n):
     return get_vector_magnitude(vxyz)
 
 
-def find_radial_velocity(galaxy_name, names, x, y, z, vx, vy, vz, r, v):
+def find_radial_velocity(galaxy_name, x, y, z, vx, vy, vz, r, v):
     if galaxy_name == pri_galaxy_name:
         max_r = dr1
         n = norm_spin1
@@ -107,7 +94,7 @@ def find_radial_velocity(galaxy_name, names, x, y, z, vx, vy, vz, r, v):
         max_r = dr2
         n = norm_spin2
 
-    gal = find_galaxy(galaxy_name, names)
+    gal = find_galaxy(galaxy_name)
 
     for i in range(len(x)-1):
         if i == gal:
@@ -182,8 +169,8 @@ def main():  # Calling all functions in order.
 
     file_read()
 
-    find_radial_velocity(pri_galaxy_name, pri_names, pri_x, pri_y, pri_z, pri_vx, pri_vy, pri_vz, pri_r, pri_v)
-    find_radial_velocity(sec_galaxy_name, sec_names, sec_x, sec_y, sec_z, sec_vx, sec_vy, sec_vz, sec_r, sec_v)
+    find_radial_velocity(pri_galaxy_name, pri_x, pri_y, pri_z, pri_vx, pri_vy, pri_vz, pri_r, pri_v)
+    find_radial_velocity(sec_galaxy_name, sec_x, sec_y, sec_z, sec_vx, sec_vy, sec_vz, sec_r, sec_v)
 
     plot_rot_curve(primary, pri_r, pri_v)
     plot_rot_curve(secondary, sec_r, sec_v)
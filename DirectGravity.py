@@ -0,0 +1,49 @@
+import numpy as np
+from IntData import G
+
+block_size = 2 ** 20  # Number of target-source pairs held in memory at once.
+
+
+def direct_acceleration(target_pos, source_pos, source_mass, soft=0.0):  # Direct sum of every source on every target.
+    acc = np.zeros_like(target_pos)
+    if len(source_pos) == 0:
+        return acc
+
+    rows = max(1, block_size // len(source_pos))
+    for start in range(0, len(target_pos), rows):
+        stop = min(start + rows, len(target_pos))
+        dx = target_pos[start:stop, 0, np.newaxis] - source_pos[np.newaxis, :, 0]
+        dy = target_pos[start:stop, 1, np.newaxis] - source_pos[np.newaxis, :, 1]
+        dz = target_pos[start:stop, 2, np.newaxis] - source_pos[np.newaxis, :, 2]
+        r2 = (dx ** 2) + (dy ** 2) + (dz ** 2)
+        r = np.sqrt(r2)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            a_over_r = - (G * source_mass) / ((r2 + (soft ** 2)) * r)
+        a_over_r[r == 0] = 0  # A source exerts no force on itself.
+
+        # Each target's sum runs along the last axis, so it does not depend on how the targets are split up.
+        acc[start:stop, 0] = np.sum(a_over_r * dx, axis=1)
+        acc[start:stop, 1] = np.sum(a_over_r * dy, axis=1)
+        acc[start:stop, 2] = np.sum(a_over_r * dz, axis=1)
+
+    return acc
+
+
+def direct_potential(target_pos, source_pos, source_mass):  # Potential per unit mass at every target.
+    phi = np.zeros(len(target_pos))
+    if len(source_pos) == 0:
+        return phi
+
+    rows = max(1, block_size // len(source_pos))
+    for start in range(0, len(target_pos), rows):
+        stop = min(start + rows, len(target_pos))
+        r = np.sqrt(np.sum((target_pos[start:stop, np.newaxis, :] - source_pos[np.newaxis, :, :]) ** 2, axis=2))
+        r[r == 0] = np.inf  # A source has no potential energy with itself.
+        phi[start:stop] = np.sum(- (G * source_mass) / r, axis=1)
+
+    return phi
+
+
+def direct_potential_energy(target_pos, target_mass, source_pos, source_mass):  # Half of each pair's energy.
+    return np.sum(direct_potential(target_pos, source_pos, source_mass) * (target_mass / 2))
@@ -6,6 +6,7 @@ import matplotlib.cm as cmx
 from mpl_toolkits.mplot3d import Axes3D
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 from IntData import *
+from Snapshots import read_image
 
 pri_names = []
 pri_x = []
@@ -60,20 +61,20 @@ def centring_particles():
 
 
 def point_read(image_time):  # Reads information about all particles in the simulation.
-    file = open("Forwards/image_%.5f.txt" % image_time)
-
-    for line in file:  # Reads the file line by line.
-        data = line.strip().split()
-        if data[0] == pri_galaxy_name or data[0] == pri_disk_name:
-            pri_names.append(data[0])
-            pri_x.append(float(data[2]))
-            pri_y.append(float(data[3]))
-            pri_z.append(float(data[4]))
-        elif data[0] == sec_galaxy_name or sec_disk_name:
-            sec_names.append(data[0])
-            sec_x.append(float(data[2]))
-            sec_y.append(float(data[3]))
-            sec_z.append(float(data[4]))
+    frame = read_image(image_time, Gyr, False, snapshot_format)
+    names = frame.names()
+
+    for i in range(len(frame)):
+        if names[i] == pri_galaxy_name or names[i] == pri_disk_name:
+            pri_names.append(names[i])
+            pri_x.append(frame.pos[i, 0])
+            pri_y.append(frame.pos[i, 1])
+            pri_z.append(frame.pos[i, 2])
+        else:
+            sec_names.append(names[i])
+            sec_x.append(frame.pos[i, 0])
+            sec_y.append(frame.pos[i, 1])
+            sec_z.append(frame.pos[i, 2])
 
 
 def change_units():
@@ -4,6 +4,7 @@ import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 from IntData import *
+from Snapshots import read_image
 
 names1 = []
 x1 = []
@@ -52,20 +53,16 @@ def centring_gal(names, x, y, z, galaxy_name):
 
 
 def point_read():  # Reads information about all particles in the simulation.
-    file = open("Forwards/image_%.5f.txt" % final_image_time)
-
-    for line in file:  # Reads the file line by line.
-        data = line.strip().split()
-        if data[0] == pri_galaxy_name or pri_disk_name:
-            names1.append(data[0])
-            x1.append(float(data[2]))
-            y1.append(float(data[3]))
-            z1.append(float(data[4]))
-        if data[0] == sec_galaxy_name or sec_disk_name:
-            names2.append(data[0])
-            x2.append(float(data[2]))
-            y2.append(float(data[3]))
-            z2.append(float(data[4]))
+    frame = read_image(final_image_time, Gyr, False, snapshot_format)
+
+    names1.extend(frame.names())
+    x1.extend(frame.pos[:, 0].tolist())
+    y1.extend(frame.pos[:, 1].tolist())
+    z1.extend(frame.pos[:, 2].tolist())
+    names2.extend(frame.names())
+    x2.extend(frame.pos[:, 0].tolist())
+    y2.extend(frame.pos[:, 1].tolist())
+    z2.extend(frame.pos[:, 2].tolist())
 
 
 def change_units(x, y, z):
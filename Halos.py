@@ -0,0 +1,94 @@
+import math
+import numpy as np
+from IntData import G
+
+
+class NFWHalo:
+    def __init__(self, m_vir, r_s, c, r_vir):
+        self.m_vir = m_vir  # Virial mass of the dark matter halo.
+        self.r_s = r_s  # Scale radius of the dark matter halo.
+        self.c = c  # Concentration of the dark matter halo.
+        self.r_vir = r_vir  # Virial radius of the dark matter halo.
+        self.mu_c = math.log(1 + c) - (c / (1 + c))  # NFW mass function at the concentration, m(c).
+        self.g_norm = (G * m_vir) / self.mu_c  # Constant G * M_vir / m(c) in front of every halo force.
+
+    def radial_acceleration(self, r):  # Signed radial acceleration at distance r, negative towards the centre.
+        x = r / self.r_s
+        return self.g_norm * ((x / (1 + x)) - np.log1p(x)) / (r ** 2)
+
+    def acceleration(self, pos, centre):  # Accelerations of all positions in an (N,3) array due to the halo.
+        r_xyz = pos - centre
+        r2 = np.einsum('ij,ij->i', r_xyz, r_xyz)
+        r = np.sqrt(r2)
+        x = r / self.r_s
+
+        a_over_r = np.zeros_like(r)
+        inside = r > 0  # A particle sitting on the centre, i.e. the galaxy itself, feels no force from its halo.
+        a_over_r[inside] = self.g_norm * ((x[inside] / (1 + x[inside])) - np.log1p(x[inside])) / \
+            (r2[inside] * r[inside])
+
+        return a_over_r[:, np.newaxis] * r_xyz
+
+    def potential(self, pos, centre):  # Potential per unit mass at all positions in an (N,3) array.
+        r = np.sqrt(np.einsum('ij,ij->i', pos - centre, pos - centre))
+
+        phi = np.zeros_like(r)
+        inside = r > 0
+        phi[inside] = -(self.g_norm / r[inside]) * np.log1p(r[inside] / self.r_s)
+        return phi
+
+    def density(self, r):
+        x = r / self.r_s
+        return self.m_vir / (4 * math.pi * (self.r_s ** 3) * self.mu_c) / (x * (1 + x) ** 2)
+
+    def enclosed_mass(self, r):  # Mass inside radius r, reaching m_vir at the virial radius.
+        x = r / self.r_s
+        return self.m_vir * (np.log1p(x) - (x / (1 + x))) / self.mu_c
+
+    def sample(self, n, centre_mass=0.0, grid=3000, rows=400, columns=256):  # Positions and velocities of n equal
+        # mass particles inside the virial radius, in equilibrium in the halo plus a point mass at its centre. Radii
+        # come from the inverse of the enclosed mass, speeds from the Eddington distribution function of the whole,
+        # untruncated halo, both tabulated. Particles are only placed inside the virial radius.
+        r = np.geomspace(1e-4 * self.r_s, 1e4 * self.r_vir, grid)
+        mass = self.enclosed_mass(r)
+
+        u = np.random.uniform(0, 1.0, n) * self.m_vir
+        radii = np.interp(u, np.concatenate([[0], mass]), np.concatenate([[0], r]))
+
+        def psi(radius):  # Relative potential, minus the potential, which is zero far from the halo.
+            return self.g_norm * np.log1p(radius / self.r_s) / radius + G * centre_mass / radius
+
+        x = r / self.r_s
+        drho_dpsi = self.density(r) * (1 + 3 * x) * r / ((1 + x) * G * (mass + centre_mass))
+        psi_grid = psi(r)[::-1]  # Rising, for interpolation.
+        drho_dpsi = drho_dpsi[::-1]
+
+        # Eddington's formula, f(E) = d/dE of the integral of (drho/dpsi) / sqrt(E - psi) over psi from 0 to E,
+        # divided by sqrt(8) pi^2. Psi = E - t^2 removes the singularity at psi = E.
+        energy = psi_grid
+        t = np.linspace(0, 1, columns)[np.newaxis, :] * np.sqrt(energy)[:, np.newaxis]
+        integrand = 2 * np.interp(energy[:, np.newaxis] - t ** 2, psi_grid, drho_dpsi)
+        integral = np.trapezoid(integrand, t, axis=1)
+        f = np.maximum(np.gradient(integral, energy) / (math.sqrt(8) * math.pi ** 2), 0)
+
+        # Distribution of v / v_escape at a set of radii, p(q) = q^2 f(psi (1 - q^2)), turned into cumulative tables.
+        row_r = np.geomspace(r[0], self.r_vir, rows)
+        q = np.linspace(0, 1, columns)
+        p = (q ** 2)[np.newaxis, :] * np.interp(psi(row_r)[:, np.newaxis] * (1 - q ** 2), energy, f)
+        cdf = np.concatenate([np.zeros((rows, 1)), np.cumsum((p[:, 1:] + p[:, :-1]) / 2, axis=1)], axis=1)
+        cdf /= np.where(cdf[:, -1:] > 0, cdf[:, -1:], 1)
+
+        row = np.clip(np.searchsorted(row_r, radii), 0, rows - 1)  # Table row of each particle.
+        target = row + np.random.uniform(0, 1.0, n) * (1 - 1e-12)
+        flat = (cdf + np.arange(rows)[:, np.newaxis]).ravel()  # Every row's table, one after another, rising.
+        k = np.clip(np.searchsorted(flat, target, side='right') - 1, 0, rows * columns - 2)
+        k -= (k % columns == columns - 1)  # Keeps each particle inside its own row's table.
+        fraction = (target - flat[k]) / np.maximum(flat[k + 1] - flat[k], 1e-300)
+        speeds = (q[k % columns] + np.clip(fraction, 0, 1) * (q[1] - q[0])) * np.sqrt(2 * psi(radii))
+
+        return random_directions(n) * radii[:, np.newaxis], random_directions(n) * speeds[:, np.newaxis]
+
+
+def random_directions(n):  # Unit vectors pointing in random directions.
+    xyz = np.random.normal(size=(n, 3))
+    return xyz / np.sqrt(np.sum(xyz ** 2, axis=1))[:, np.newaxis]
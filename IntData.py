@@ -1,3 +1,6 @@
+import sys
+import types
+
 # Simulation options:
 initial_txt = False  # Option to read the initial conditions from a text file.
 galaxy_files = False  # Option to read in all galaxy particles from specific text files for each galaxy.
@@ -7,6 +10,28 @@ rewind = False  # Option to run the simulation backwards.
 calc_energy = False  # Option to calculate energy during the simulation.
 softening = False  # Option to include softening in the simulation.
 random_disks = True  # Option to give each galaxy randomly distributed disk, as opposed to rings.
+massless_disks = True  # Option for disk particles to be massless tracers, that feel but do not exert gravity.
+gravity_solver = "direct"  # Solver for newtonian gravity: "direct" summation, Barnes-Hut "tree" or particle-mesh "pm".
+tree_theta = 0.5  # Opening angle of the tree, smaller values are more accurate and slower.
+tree_quadrupole = False  # Option to include quadrupole moments of the tree nodes, as well as monopoles.
+tree_leaf_size = 8  # Largest number of particles in a tree node before it is split.
+pm_grid = 64  # Number of mesh cells along each side of the particle-mesh grid.
+pm_assignment = "CIC"  # Mass assignment of the particle-mesh, cloud-in-cell "CIC" or triangular-shaped-cloud "TSC".
+pm_box_size = 0  # Side of the particle-mesh grid in kpc, centred between the galaxies, or 0 to fit all particles.
+force_workers = 1  # Number of processes sharing the force calculation, 1 calculates every force in this process.
+integrator = "kdk"  # Time integrator: "kdk" or "dkd" leapfrog, or "yoshida4", "forest_ruth" or "yoshida6".
+block_timesteps = False  # Option to give each particle its own power-of-two fraction of time_step.
+max_block_level = 4  # Deepest block step level, where particles step by time_step / 2 ** max_block_level.
+block_eta = 0.025  # Accuracy of block steps: fraction of a particle's relative velocity it may change by in one step.
+record_policy = "centres"  # Particles whose paths are recorded: galaxy "centres", "tracers" as well, or "all".
+record_tracers = 100  # Number of massless tracers (or disk particles) recorded by the "tracers" policy.
+record_cadence = 1  # Number of steps between recorded path points.
+checkpoint_interval = 0  # Number of steps between checkpoints of the run, which --resume carries on from. 0 for none.
+checkpoints_kept = 2  # Number of the newest checkpoints kept, older ones are deleted. 0 keeps every checkpoint.
+snapshot_format = "binary"  # Format of the images: one "binary" snapshot file per run, or a "text" file per image.
+async_snapshots = True  # Option to write images on a background thread while the simulation carries on.
+snapshot_queue_size = 4  # Largest number of images waiting to be written before the simulation has to wait.
+snapshot_queue_timeout = 60  # Seconds the simulation waits for the writer to catch up before stopping with an error.
 
 # Galaxy options:
 newtonian_gravity = False  # Option to include newtonian gravity in the interaction.
@@ -43,14 +68,7 @@ critical_density = 136 * sm / (kpc ** 3)  # Critical density of the universe.
 # Simulation time conditions:
 time_step = 2e5 * yr  # Time between each step.
 time_run = 6 * Gyr  # Total time simulation is run for.
-if rewind:
-    time_step = - time_step  # Time between each step, running backwards.
-    time_run = - time_run  # Total time simulation is run for, backwards.
 images = 31  # Total number of images shown. Remember to add 1 to make sure you get the beginning and end image.
-frames = images - 1  # Number of intervals between images being shown. Could be: frames = time_run / interval.
-no_step = time_run / time_step  # Total number of steps in simulation.
-interval = no_step / frames  # Number of data points between image data points.
-image_time_step = time_run / (frames * Gyr)  # Time between images being shown.
 
 # Identifiers for each galaxy, used in the code to specify each.
 primary = 1
@@ -74,9 +92,7 @@ pri_path = "b-"  # Colour of path for primary galaxy being plotted.
 norm_spin1 = [0.992, 0.118, 0.048]  # Normalised spin of the primary galaxy for x, y and z directions.
 dr1 = 28.86 * kpc  # Radius of disk if primary galaxy.
 no_rings1 = 4  # Number of rings in primary galaxy.
-ring_rad1 = dr1 / no_rings1  # Radius of innermost ring from primary galaxy centre.
 no_rp1 = 6  # Number of particles in innermost ring of primary galaxy.
-tot_dp1 = no_rp1 * (sum(range(0, no_rings1 + 1)))  # 1500  # Total number of particles in a disk of primary galaxy.
 mdp1 = 1  # Mass of each particle in the primary disk.
 mu1 = 0.3  # Mean value for the gaussian distribution of particles in the primary galaxy.
 sigma1 = 0.3  # Variance value for the gaussian distribution of particles in the primary galaxy.
@@ -91,7 +107,8 @@ R_vir1 = 26.8 * kpc  # Virial radius of primary galaxy's dark matter halo.
 rho_zero1 = 0.05 * sm / (pc ** 3)
 V_max1 = 325 * km_s  # Maximum velocity of a particle on the outside of the primary galaxy disk.
 pri_dmh_name = "pDMH"  # Name of all the dark matter halo particles in the primary galaxy.
-pri_dmh_file = "pri_live_dmh.txt"  # Name of the file that contains the particles for the primary galaxy's live dmh.
+pri_dmh_file = "pri_live_dmh.nbs"  # Name of the file that contains the particles for the primary galaxy's live dmh.
+pri_dmh_particles = 10000  # Number of particles generated for the primary galaxy's live dmh, if its file is missing.
 
 # Secondary galaxy starting conditions:
 sec_galaxy_name = "NGC5258"  # Name of the secondary galaxy.
@@ -109,9 +126,7 @@ sec_path = "r-"  # Colour of path for secondary galaxy being plotted.
 norm_spin2 = [-0.547, 0.800, 0.246]  # Normalised spin of the primary galaxy for x, y and z directions.
 dr2 = 24.215 * kpc  # Radius of disk if secondary galaxy.
 no_rings2 = 4  # Number of rings in secondary galaxy.
-ring_rad2 = dr2 / no_rings2  # Radius of innermost ring from secondary galaxy centre.
 no_rp2 = 6  # Number of particles in innermost ring of secondary galaxy.
-tot_dp2 = no_rp2 * (sum(range(0, no_rings2 + 1)))  # 1500  # Total number of particles in a disk of secondary galaxy.
 mdp2 = 1  # 7e9 * sm / tot_dp2 # Mass of each particle in the secondary disk.
 mu2 = 0.3  # Mean value for the gaussian distribution of particles in the secondary galaxy.
 sigma2 = 0.3  # Variance value for the gaussian distribution of particles in the secondary galaxy.
@@ -126,54 +141,89 @@ R_vir2 = 35.4 * kpc  # Virial radius of secondary galaxy's dark matter halo.
 rho_zero2 = 0.71 * sm / (pc ** 3)
 V_max2 = 320 * km_s  # Maximum velocity of a particle on the outside of the secondary galaxy disk.
 sec_dmh_name = "sDMH"  # Name of all the dark matter halo particles in the secondary galaxy.
-sec_dmh_file = "sec_live_dmh.txt"  # Name of the file that contains the particles for the secondary galaxy's live dmh.
-
-# Total number of particles in simulation:
-tot_part = 0
-if primary_isolation:
-    tot_part += tot_dp1 + 1
-if secondary_isolation:
-    tot_part += tot_dp2 + 1
-if not primary_isolation and not secondary_isolation:
-    if primary_gal:
-        tot_part += 1  # Total number of particles in the simulation.
-    if primary_disk:
-        tot_part += tot_dp1  # Total number of particles in the simulation.
-    if secondary_gal:
-        tot_part += 1  # Total number of particles in the simulation.
-    if secondary_disk:
-        tot_part += tot_dp2  # Total number of particles in the simulation.
-
-# Setting the softening parameter for the simulation:
-soft_param = 0.98 * (tot_part ** -0.26)
-
-# Forcefully sets some initial conditions if running simulation of primary galaxy in isolation:
-if primary_isolation:
-    secondary_gal = False
-    secondary_disk = False
-    secondary_dmh_potential = False
-    secondary_live_dmh = False
-    secondary_dynamical_friction = False
-    xg1 = 0
-    yg1 = 0
-    zg1 = 0
-    vxg1 = 0
-    vyg1 = 0
-    vzg1 = 0
-
-# Forcefully sets some initial conditions if running simulation of secondary galaxy in isolation:
-if secondary_isolation:
-    primary_gal = False
-    primary_disk = False
-    primary_dmh_potential = False
-    primary_live_dmh = False
-    primary_dynamical_friction = False
-    xg2 = 0
-    yg2 = 0
-    zg2 = 0
-    vxg2 = 0
-    vyg2 = 0
-    vzg2 = 0
+sec_dmh_file = "sec_live_dmh.nbs"  # Name of the file that contains the particles for the secondary galaxy's live dmh.
+sec_dmh_particles = 10000  # Number of particles generated for the secondary galaxy's live dmh, if its file is missing.
+
+constants = ['G', 'km_s', 'pc', 'kpc', 'sm', 'yr', 'Gyr', 'critical_density', 'primary', 'secondary']  # Fixed values.
+
+# Every option above with its value as set in this file, before the values worked out from them below.
+option_defaults = {name: value for name, value in list(globals().items()) if not name.startswith('_') and
+                   name not in constants + ['constants'] and not callable(value) and
+                   not isinstance(value, types.ModuleType)}
+
+
+def softening_length(n):  # Softening parameter for a simulation of n particles.
+    return 0.98 * (n ** -0.26)
+
+
+def derive_options(o):  # Works out the values that follow from the options of o, which is this module or a
+    # SimulationConfig, and sets them on it. Options are only ever read from o, so one process can hold many configs.
+    if o.rewind:
+        o.time_step = - o.time_step  # Time between each step, running backwards.
+        o.time_run = - o.time_run  # Total time simulation is run for, backwards.
+    o.frames = o.images - 1  # Number of intervals between images being shown. Could be: frames = time_run / interval.
+    o.no_step = o.time_run / o.time_step  # Total number of steps in simulation.
+    o.interval = o.no_step / o.frames  # Number of data points between image data points.
+    o.image_time_step = o.time_run / (o.frames * Gyr)  # Time between images being shown.
+
+    o.ring_rad1 = o.dr1 / o.no_rings1  # Radius of innermost ring from primary galaxy centre.
+    o.tot_dp1 = o.no_rp1 * (sum(range(0, o.no_rings1 + 1)))  # 1500  # Total number of particles in a primary disk.
+    o.ring_rad2 = o.dr2 / o.no_rings2  # Radius of innermost ring from secondary galaxy centre.
+    o.tot_dp2 = o.no_rp2 * (sum(range(0, o.no_rings2 + 1)))  # 1500  # Total number of particles in a secondary disk.
+
+    # Total number of particles in simulation:
+    o.tot_part = 0
+    if o.primary_isolation:
+        o.tot_part += o.tot_dp1 + 1
+    if o.secondary_isolation:
+        o.tot_part += o.tot_dp2 + 1
+    if not o.primary_isolation and not o.secondary_isolation:
+        if o.primary_gal:
+            o.tot_part += 1  # Total number of particles in the simulation.
+        if o.primary_disk:
+            o.tot_part += o.tot_dp1  # Total number of particles in the simulation.
+        if o.secondary_gal:
+            o.tot_part += 1  # Total number of particles in the simulation.
+        if o.secondary_disk:
+            o.tot_part += o.tot_dp2  # Total number of particles in the simulation.
+        if o.primary_live_dmh:
+            o.tot_part += o.pri_dmh_particles  # Total number of particles in the simulation.
+        if o.secondary_live_dmh:
+            o.tot_part += o.sec_dmh_particles  # Total number of particles in the simulation.
+
+    # Setting the softening parameter for the simulation:
+    o.soft_param = softening_length(o.tot_part)
+
+    # Forcefully sets some initial conditions if running simulation of primary galaxy in isolation:
+    if o.primary_isolation:
+        o.secondary_gal = False
+        o.secondary_disk = False
+        o.secondary_dmh_potential = False
+        o.secondary_live_dmh = False
+        o.secondary_dynamical_friction = False
+        o.xg1 = 0
+        o.yg1 = 0
+        o.zg1 = 0
+        o.vxg1 = 0
+        o.vyg1 = 0
+        o.vzg1 = 0
+
+    # Forcefully sets some initial conditions if running simulation of secondary galaxy in isolation:
+    if o.secondary_isolation:
+        o.primary_gal = False
+        o.primary_disk = False
+        o.primary_dmh_potential = False
+        o.primary_live_dmh = False
+        o.primary_dynamical_friction = False
+        o.xg2 = 0
+        o.yg2 = 0
+        o.zg2 = 0
+        o.vxg2 = 0
+        o.vyg2 = 0
+        o.vzg2 = 0
+
+
+derive_options(sys.modules[__name__])  # Scripts importing this file see every value, worked out as before.
 
 '''
 Incorrect initial conditions leads to errors with interaction.
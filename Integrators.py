@@ -0,0 +1,46 @@
+class Integrator:  # A symplectic scheme, given as the kicks and drifts that make up one step.
+    def __init__(self, name, stages, order):
+        self.name = name
+        self.stages = stages  # ("kick" or "drift", fraction of time_step) pairs, in the order they are applied.
+        self.order = order  # Order of accuracy of the scheme.
+
+    def synchronised(self, stage):  # Whether the positions are at the end of the step from this stage on.
+        return all(kind == "kick" for kind, fraction in self.stages[stage:])
+
+
+def kdk_composition(name, weights, order):  # Kick-drift-kick leapfrogs of the given fractions of a step, one after
+    stages = [("kick", weights[0] / 2)]  # another, with the kicks between them merged.
+    for i, weight in enumerate(weights):
+        stages.append(("drift", weight))
+        following = weights[i + 1] / 2 if i + 1 < len(weights) else 0
+        stages.append(("kick", weight / 2 + following))
+    return Integrator(name, stages, order)
+
+
+def dkd_composition(name, weights, order):  # Drift-kick-drift leapfrogs of the given fractions of a step, one after
+    stages = [("drift", weights[0] / 2)]  # another, with the drifts between them merged.
+    for i, weight in enumerate(weights):
+        stages.append(("kick", weight))
+        following = weights[i + 1] / 2 if i + 1 < len(weights) else 0
+        stages.append(("drift", weight / 2 + following))
+    return Integrator(name, stages, order)
+
+
+# Fractions of a step taken by each leapfrog in the fourth order scheme of Forest & Ruth (1990) and Yoshida (1990).
+w1 = 1 / (2 - 2 ** (1 / 3))
+w0 = - (2 ** (1 / 3)) * w1
+fourth_order_weights = [w1, w0, w1]
+
+# Fractions of a step taken by each leapfrog in Yoshida's (1990) sixth order solution A.
+y1 = -1.17767998417887
+y2 = 0.235573213359357
+y3 = 0.784513610477560
+y0 = 1 - 2 * (y1 + y2 + y3)
+sixth_order_weights = [y3, y2, y1, y0, y1, y2, y3]
+
+integrators = {scheme.name: scheme for scheme in [
+    kdk_composition("kdk", [1.0], 2),  # Velocity Verlet, the original scheme.
+    dkd_composition("dkd", [1.0], 2),  # Position Verlet.
+    kdk_composition("yoshida4", fourth_order_weights, 4),
+    dkd_composition("forest_ruth", fourth_order_weights, 4),
+    kdk_composition("yoshida6", sixth_order_weights, 6)]}
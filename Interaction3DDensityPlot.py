@@ -6,8 +6,9 @@ import matplotlib.cm as cmx
 from mpl_toolkits.mplot3d import Axes3D
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 from IntData import *
+from Snapshots import read_image
 
-names = []
+galaxies = {}  # Position of each galaxy centre in the frame read in.
 x = []
 y = []
 z = []
@@ -25,13 +26,8 @@ y_los = [0, -88.53]
 z_los = [0, -21.78]
 
 
-def find_galaxy(galaxy_name):  # Finds position of a galaxy in the list of bodies.
-    position = 0
-    for i in range(len(names)):
-        if names[i] == galaxy_name:
-            position = i
-            break
-    return position
+def find_galaxy(galaxy_name):  # Position of a galaxy, from the type codes of the frame read in.
+    return galaxies.get(galaxy_name, 0)
 
 
 def centring_particles():
@@ -48,15 +44,12 @@ def centring_particles():
 
 
 def point_read():  # Reads information about all particles in the simulation.
-    file = open("Forwards/image_%.5f.txt" % final_image_time)
+    frame = read_image(final_image_time, Gyr, False, snapshot_format)
 
-    for line in file:  # Reads the file line by line.
-        data = line.strip().split()
-        if data[0] == pri_galaxy_name or sec_galaxy_name or pri_disk_name or sec_disk_name:
-            names.append(data[0])
-            x.append(float(data[2]))
-            y.append(float(data[3]))
-            z.append(float(data[4]))
+    galaxies.update({name: frame.index_of(name) for name in (pri_galaxy_name, sec_galaxy_name)})
+    x.extend(frame.pos[:, 0].tolist())
+    y.extend(frame.pos[:, 1].tolist())
+    z.extend(frame.pos[:, 2].tolist())
 
 
 def change_units():
@@ -113,7 +106,6 @@ def refine():
                 pop_list.append(i)
 
     for m in range(len(pop_list)-1, 0, -1):
-        names.pop(pop_list[m])
         x.pop(pop_list[m])
         y.pop(pop_list[m])
         z.pop(pop_list[m])
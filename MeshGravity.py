@@ -0,0 +1,133 @@
+import numpy as np
+from IntData import G
+from DirectGravity import direct_acceleration, direct_potential
+
+margin = 2  # Number of empty cells kept between the particles and each edge of the mesh.
+
+
+def assignment_stencil(grid_pos, scheme):  # Cells and weights each particle shares its mass with, or is read from.
+    if scheme == "TSC":
+        nearest = np.floor(grid_pos + 0.5).astype(np.int64)
+        d = grid_pos - nearest
+        weights = [0.5 * (0.5 - d) ** 2, 0.75 - d ** 2, 0.5 * (0.5 + d) ** 2]  # For offsets -1, 0 and +1.
+        offsets = [-1, 0, 1]
+    else:
+        nearest = np.floor(grid_pos).astype(np.int64)
+        d = grid_pos - nearest
+        weights = [1 - d, d]  # For offsets 0 and +1.
+        offsets = [0, 1]
+
+    for i, ox in enumerate(offsets):
+        for j, oy in enumerate(offsets):
+            for k, oz in enumerate(offsets):
+                cell = nearest + np.array([ox, oy, oz])
+                yield cell, weights[i][:, 0] * weights[j][:, 1] * weights[k][:, 2]
+
+
+class ParticleMesh:
+    def __init__(self, grid=64, scheme="CIC", box_size=0.0):
+        self.grid = grid  # Number of cells along each side of the mesh.
+        self.scheme = scheme  # Mass assignment scheme, cloud-in-cell "CIC" or triangular-shaped-cloud "TSC".
+        self.box_size = box_size  # Side of the mesh in metres, or 0 to fit the mesh around every particle.
+        self.green = None
+        self.green_fft = None
+        self.green_cell = None
+        self.green_soft = None
+
+    def place_mesh(self, pos, centre=None):  # Chooses the corner and cell size of the mesh for this step.
+        lo = pos.min(axis=0)
+        hi = pos.max(axis=0)
+        if centre is None or self.box_size <= 0:
+            centre = (lo + hi) / 2
+        side = self.box_size if self.box_size > 0 else max(np.max(hi - lo), 1.0)
+
+        cell = side / (self.grid - 2 * margin)
+        cell = 2.0 ** (np.ceil(4 * np.log2(cell)) / 4)  # Rounded up to a quarter power of two, so the Green's
+        self.cell = cell  # function only has to be remade when the mesh grows or shrinks noticeably.
+        self.corner = centre - (self.grid / 2) * cell
+
+    def green_function(self, soft):  # Fourier transform of the isolated Green's function on the doubled mesh.
+        if self.green_fft is not None and self.green_cell == self.cell and self.green_soft == soft:
+            return self.green_fft
+
+        n = 2 * self.grid
+        i = np.arange(n)
+        i = np.minimum(i, n - i) * self.cell  # Distance to the nearest image along one axis.
+        r2 = i[:, np.newaxis, np.newaxis] ** 2 + i[np.newaxis, :, np.newaxis] ** 2 + i[np.newaxis, np.newaxis, :] ** 2
+        eps = max(soft, 0.5 * self.cell)  # The mesh cannot resolve forces below about one cell.
+        self.green = - G / np.sqrt(r2 + eps ** 2)
+
+        self.green_fft = np.fft.rfftn(self.green)
+        self.green_cell = self.cell
+        self.green_soft = soft
+        return self.green_fft
+
+    def inside(self, pos):  # Mask of positions far enough inside the mesh for their whole stencil to fit.
+        grid_pos = (pos - self.corner) / self.cell
+        return np.all((grid_pos >= margin) & (grid_pos < self.grid - margin), axis=1)
+
+    def deposit(self, pos, mass):
+        grid_pos = (pos - self.corner) / self.cell - 0.5  # Positions in units of cells, measured between centres.
+        rho = np.zeros(self.grid ** 3)
+        for cell, weight in assignment_stencil(grid_pos, self.scheme):
+            flat = (cell[:, 0] * self.grid + cell[:, 1]) * self.grid + cell[:, 2]
+            rho += np.bincount(flat, weights=mass * weight, minlength=self.grid ** 3)
+        return rho.reshape((self.grid,) * 3)
+
+    def interpolate(self, field, pos):
+        grid_pos = (pos - self.corner) / self.cell - 0.5
+        values = np.zeros(len(pos))
+        for cell, weight in assignment_stencil(grid_pos, self.scheme):
+            values += weight * field[cell[:, 0], cell[:, 1], cell[:, 2]]
+        return values
+
+    def self_potential(self, pos):  # Potential per unit mass that a source at pos feels from its own deposit.
+        grid_pos = (pos - self.corner) / self.cell - 0.5
+        n = 2 * self.grid
+        stencil = list(assignment_stencil(grid_pos, self.scheme))
+        phi = np.zeros(len(pos))
+        for cell_a, weight_a in stencil:
+            for cell_b, weight_b in stencil:
+                d = (cell_a - cell_b) % n
+                phi += weight_a * weight_b * self.green[d[:, 0], d[:, 1], d[:, 2]]
+        return phi
+
+    def potential(self, rho, soft):  # Solves Poisson's equation with isolated boundaries, by zero padding.
+        n = 2 * self.grid
+        padded = np.zeros((n, n, n))
+        padded[:self.grid, :self.grid, :self.grid] = rho
+        phi = np.fft.irfftn(np.fft.rfftn(padded) * self.green_function(soft), s=(n, n, n))
+        return phi[:self.grid, :self.grid, :self.grid]
+
+    def acceleration(self, target_pos, source_pos, source_mass, soft=0.0, potential=False, centre=None,
+                     self_mass=None):  # Self_mass is the mass each target itself put on the mesh as a source.
+        self.place_mesh(np.concatenate([target_pos, source_pos]), centre)
+
+        on_mesh = self.inside(source_pos)
+        phi_mesh = self.potential(self.deposit(source_pos[on_mesh], source_mass[on_mesh]), soft)
+        gradient = np.gradient(phi_mesh, self.cell)
+
+        acc = np.zeros_like(target_pos)
+        phi = np.zeros(len(target_pos))
+        reached = self.inside(target_pos)
+        for i in range(3):
+            acc[reached, i] = - self.interpolate(gradient[i], target_pos[reached])
+        if potential:
+            phi[reached] = self.interpolate(phi_mesh, target_pos[reached])
+            if self_mass is not None:  # A source has no potential energy with itself.
+                own = reached & (self_mass > 0)
+                phi[own] -= self_mass[own] * self.self_potential(target_pos[own])
+
+        # Sources and targets off the mesh, when it has a fixed size, are summed directly instead.
+        off = ~on_mesh
+        if np.any(off):
+            acc += direct_acceleration(target_pos, source_pos[off], source_mass[off], soft)
+            if potential:
+                phi += direct_potential(target_pos, source_pos[off], source_mass[off])
+        missed = ~reached
+        if np.any(missed):
+            acc[missed] += direct_acceleration(target_pos[missed], source_pos[on_mesh], source_mass[on_mesh], soft)
+            if potential:
+                phi[missed] += direct_potential(target_pos[missed], source_pos[on_mesh], source_mass[on_mesh])
+
+        return acc, phi
@@ -3,24 +3,60 @@ import numpy as np
 import matplotlib.pyplot as plt
 import time
 import os
-import random
+import sys
 from mpl_toolkits.mplot3d import Axes3D
+from scipy.special import erf
 from IntData import *
-
-objects = []  # List of all objects in galaxy.
+from Configuration import SimulationConfig
+from ParticleSet import ParticleSet, ParticleBlock
+from Halos import NFWHalo
+from DirectGravity import direct_acceleration, direct_potential_energy
+from TreeGravity import Octree
+from MeshGravity import ParticleMesh
+from ParallelForces import ForcePool
+from Integrators import integrators
+from Checkpoints import checkpoint_directory, checkpoint_file_name, list_checkpoints, save_checkpoint, \
+    load_checkpoint, prune_checkpoints, random_states, set_random_states
+from Trajectories import TrajectoryRecorder
+from Snapshots import SnapshotWriter, SnapshotSeries, SnapshotFile, BackgroundWriter, copy_frame, snapshot_file_name, \
+    image_file_name
+
+objects = []  # List of all objects in galaxy, as single Bodies or ParticleBlocks of many particles.
+
+type_names = []  # Type codes of the particle store, in the order of these names.
+type_colours = []
+dm_halos = {}  # Dark matter halo of each galaxy, with its force constants computed once for each configuration.
+particle_mesh = None  # Keeps its Green's function between steps.
+
+force_pool = None  # Worker processes sharing the particle arrays, while a simulation runs with force_workers > 1.
+snapshot_writer = None  # Open binary snapshot file, while a simulation runs.
+snapshot_queue = None  # Background thread writing the images, while a simulation runs with async_snapshots.
+resume = False  # Whether to carry on from the newest checkpoint, set by running with --resume.
 
 start_time = time.time()  # Sets start time in order to find runtime of program.
 
 
+def configure(config):  # Makes a SimulationConfig's options the values every function here reads, so that one process
+    global objects, type_names, type_colours, dm_halos, particle_mesh, start_time  # can run many simulations in turn.
+    globals().update(config.values())
+
+    objects = []
+    type_names = [pri_galaxy_name, pri_disk_name, pri_dmh_name, sec_galaxy_name, sec_disk_name, sec_dmh_name]
+    type_colours = [pri_galaxy_marker, pri_disk_marker, '', sec_galaxy_marker, sec_disk_marker, '']
+    dm_halos = {primary: NFWHalo(M_vir1, R_s1, c1, R_vir1), secondary: NFWHalo(M_vir2, R_s2, c2, R_vir2)}
+    particle_mesh = ParticleMesh(pm_grid, pm_assignment, pm_box_size * kpc)
+    start_time = time.time()
+
+
+configure(SimulationConfig())  # The options in IntData, until main is given others.
+
+
 class Body:
     def __init__(self, name, m, position, velocity, colour):
         self.name = name  # Name of body.
         self.m = m  # Mass of body.
         self.xyz = position  # Array of x, y and z position of body.
         self.v_xyz = velocity  # Array of x, y and z velocities of body.
-        self.a_xyz = [0, 0, 0]  # Array of x, y and z acceleration of body.
-        self.saved_xyz = [[], [], []]  # Array of all x, y and z position values of body.
-        self.saved_v_xyz = [[], [], []]  # Array of all x, y and z velocity values of body.
         self.colour = colour  # Colour of body on images.
 
     def name(self):
@@ -35,104 +71,9 @@ class Body:
     def v_xyz(self):
         return self.v_xyz
 
-    def a_xyz(self):
-        return self.a_xyz
-
-    def saved_xyz(self):
-        return self.saved_xyz
-
-    def saved_v_xyz(self):
-        return self.saved_v_xyz
-
     def colour(self):
         return self.colour
 
-    def find_separation(self, other):
-        rx = self.xyz[0] - other.xyz[0]
-        ry = self.xyz[1] - other.xyz[1]
-        rz = self.xyz[2] - other.xyz[2]
-        r = math.sqrt((rx ** 2) + (ry ** 2) + (rz ** 2))
-        return [rx, ry, rz], r
-
-    def find_relative_velocity(self, other):
-        vx = self.v_xyz[0] - other.v_xyz[0]
-        vy = self.v_xyz[1] - other.v_xyz[1]
-        vz = self.v_xyz[2] - other.v_xyz[2]
-        v = math.sqrt((vx ** 2) + (vy ** 2) + (vz ** 2))
-        return [vx, vy, vz], v
-
-    def calculate_newtonian_acceleration(self, other):
-        r_xyz, r = self.find_separation(other)
-
-        if softening:
-            a = - (G * other.m) / ((r ** 2) + (soft_param ** 2))
-        else:
-            a = - (G * other.m) / (r ** 2)
-
-        for i in range(len(r_xyz)):
-            self.a_xyz[i] += a * (r_xyz[i] / r)
-
-    def calculate_dmh_acceleration(self, other, galaxy_id):
-        a = 0
-        r_xyz, r = self.find_separation(other)
-
-        if galaxy_id == primary:
-            a = ((G * M_vir1) / (math.log(1 + c1) - (c1 / (1 + c1)))) * \
-                (((r / (r + R_s1)) - (math.log(1 + r / R_s1))) / (r ** 2))
-        elif galaxy_id == secondary:
-            a = ((G * M_vir2) / (math.log(1 + c2) - (c2 / (1 + c2)))) * \
-                (((r / (r + R_s2)) - (math.log(1 + r / R_s2))) / (r ** 2))
-
-        for i in range(len(r_xyz)):
-            self.a_xyz[i] += a * (r_xyz[i] / r)
-
-    def calculate_dynamical_friction(self, other, causing_galaxy_id):
-        r_xyz, r = self.find_separation(other)
-        v_xyz, v = self.find_relative_velocity(other)
-
-        density_distribution = 0
-        v_dispersion = 0
-
-        # epsilon = (0.98 * (3002 ** -0.26)) * kpc
-        epsilon = 28.5 * kpc
-        ln_lambda = math.log(r / (1.4 * epsilon))
-
-        if causing_galaxy_id == primary:
-            density_distribution = (102 * critical_density) / ((r / R_s1) * (1 + (r / R_s1)) ** 2)
-            v_dispersion = V_max1 * ((1.4393 * (r / R_s1) ** 0.354) / (1 + 1.1756 * (r / R_s1) ** 0.725))
-
-        elif causing_galaxy_id == secondary:
-            density_distribution = rho_zero2 / ((r / R_s2) * (1 + (r / R_s2)) ** 2)
-            v_dispersion = V_max2 * ((1.4393 * (r / R_s2) ** 0.354) / (1 + 1.1756 * (r / R_s2) ** 0.725))
-
-        X = v / ((2 ** 0.5) * v_dispersion)
-
-        a = - ((4 * math.pi * (G ** 2) * self.m * ln_lambda * density_distribution) / (v ** 2)) * (
-                math.erf(X) - (2 * X / (math.pi ** 0.5)) * math.exp(-(X ** 2)))
-
-        for i in range(len(self.a_xyz)):
-            self.a_xyz[i] += a * (v_xyz[i] / v)
-
-    def calculate_kinetic_energy(self):
-        v = (self.v_xyz[0] ** 2) + (self.v_xyz[1] ** 2) + (self.v_xyz[2] ** 2)
-
-        return 0.5 * self.m * (v ** 2)
-
-    def calculate_potential_energy(self, other):
-        r_xyz, r = self.find_separation(other)
-
-        return - (G * self.m * other.m) / (2 * r)
-
-    def calculate_dmh_potential_energy(self, galaxy_id):
-        halo_pe = 0
-
-        if galaxy_id == primary:
-            halo_pe = -(G * M_vir1 / r) * (1 / (math.log(1 + c1) - (c1 / (1 + c1)))) * math.log(1 + (r / R_s1))
-        elif galaxy_id == secondary:
-            halo_pe = -(G * M_vir2 / r) * (1 / (math.log(1 + c2) - (c2 / (1 + c2)))) * math.log(1 + (r / R_s2))
-
-        return halo_pe * (self.m / 2)
-
 
 #######################################################################################################################
 
@@ -153,6 +94,19 @@ def option_checks():
     if not secondary_gal and secondary_dmh_potential:
         print("\nError. There has to a secondary galaxy in order to have a secondary galaxy dark matter halo.")
         exit(1)
+    if (not primary_gal and primary_live_dmh) or (not secondary_gal and secondary_live_dmh):
+        print("\nError. There has to be a galaxy in order to have a live dark matter halo for it.")
+        exit(1)
+    if (primary_live_dmh and primary_dmh_potential) or (secondary_live_dmh and secondary_dmh_potential):
+        print("\nError. A galaxy cannot have both a live dark matter halo and a dark matter halo potential.")
+        exit(1)
+    if (primary_live_dmh or secondary_live_dmh) and not newtonian_gravity:
+        print("\nError. Live dark matter halos need newtonian gravity, or their particles exert no force.")
+        exit(1)
+    if not isinstance(pri_dmh_particles, int) or pri_dmh_particles < 1 or not isinstance(sec_dmh_particles, int) \
+            or sec_dmh_particles < 1:
+        print("\nError. The number of particles in each live dark matter halo has to be a whole number of at least 1.")
+        exit(1)
     if primary_isolation and secondary_isolation:
         print("\nError. Only one galaxy can be run in isolation at a time.")
         exit(1)
@@ -160,6 +114,40 @@ def option_checks():
             or (rewind and galaxy_files):
         print("\nError. Please choose only one way of reading in files.")
         exit(1)
+    if gravity_solver not in ("direct", "tree", "pm"):
+        print("\nError. The gravity solver has to be either 'direct', 'tree' or 'pm'.")
+        exit(1)
+    if gravity_solver == "pm" and pm_assignment not in ("CIC", "TSC"):
+        print("\nError. The particle-mesh mass assignment has to be either 'CIC' or 'TSC'.")
+        exit(1)
+    if not isinstance(force_workers, int) or force_workers < 1:
+        print("\nError. The number of force workers has to be a whole number of at least 1.")
+        exit(1)
+    if record_policy not in ("centres", "tracers", "all"):
+        print("\nError. The recording policy has to be either 'centres', 'tracers' or 'all'.")
+        exit(1)
+    if not isinstance(record_cadence, int) or record_cadence < 1:
+        print("\nError. The recording cadence has to be a whole number of at least 1 step.")
+        exit(1)
+    if snapshot_format not in ("binary", "text"):
+        print("\nError. The snapshot format has to be either 'binary' or 'text'.")
+        exit(1)
+    if integrator not in integrators:
+        print("\nError. The integrator has to be one of: " + ", ".join(integrators) + ".")
+        exit(1)
+    if block_timesteps and integrator != "kdk":
+        print("\nError. Block timesteps can only be used with the 'kdk' integrator.")
+        exit(1)
+    if block_timesteps and (not isinstance(max_block_level, int) or not 0 <= max_block_level <= 20 or block_eta <= 0):
+        print("\nError. The deepest block step level has to be a whole number from 0 to 20, and block_eta above 0.")
+        exit(1)
+    if not isinstance(checkpoint_interval, int) or checkpoint_interval < 0 or not isinstance(checkpoints_kept, int) \
+            or checkpoints_kept < 0:
+        print("\nError. The checkpoint interval and number of checkpoints kept have to be whole numbers of at least 0.")
+        exit(1)
+    if async_snapshots and (snapshot_queue_size < 1 or snapshot_queue_timeout <= 0):
+        print("\nError. The snapshot queue needs room for at least 1 image and a timeout above 0 seconds.")
+        exit(1)
 
 
 def make_directories():
@@ -207,21 +195,66 @@ def read_galaxy_files():
         read_galaxy("Secondary_Galaxy.txt")
 
 
-def find_galaxy(galaxy_name):
-    position = 0
-    for i in range(len(objects)):
-        if objects[i].name == galaxy_name:
-            position = i
-            break
-    return position
+#######################################################################################################################
+
 
+def live_dmh_parameters(galaxy_id):  # Options a galaxy's live halo is generated from, kept in the header of its file.
+    if galaxy_id == primary:
+        return {'particles': pri_dmh_particles, 'M_vir': M_vir1, 'R_s': R_s1, 'c': c1, 'R_vir': R_vir1,
+                'centre_mass': mg1}
+    return {'particles': sec_dmh_particles, 'M_vir': M_vir2, 'R_s': R_s2, 'c': c2, 'R_vir': R_vir2,
+            'centre_mass': mg2}
 
-#######################################################################################################################
+
+def generate_live_dmh_file(file_name, galaxy_id):  # Samples a galaxy's halo, centred on the origin, into a
+    parameters = live_dmh_parameters(galaxy_id)  # one frame binary snapshot file.
+    n, centre_mass = parameters['particles'], parameters['centre_mass']
+    name = pri_dmh_name if galaxy_id == primary else sec_dmh_name
+
+    halo = dm_halos[galaxy_id]
+    pos, vel = halo.sample(n, centre_mass)
+    particles = ParticleSet.from_bodies([ParticleBlock(name, np.full(n, halo.m_vir / n), pos, vel, '')], type_names,
+                                        type_colours)
+
+    writer = SnapshotWriter(file_name, particles, parameters=parameters)
+    writer.write(particles, 0.0, 0)
+    writer.close()
+    print("Generated a live dark matter halo of", n, "particles in", file_name, ".\n")
+
+
+def count_live_dmh(n, galaxy_id):  # Counts the n particles read for a galaxy's live halo in the simulation, in place
+    global tot_part, soft_param  # of the number set for it, which the file need not hold.
+    tot_part += n - (pri_dmh_particles if galaxy_id == primary else sec_dmh_particles)
+    soft_param = softening_length(tot_part)
 
 
 def read_dmh_file(file_name, galaxy_id):
+    if file_name.endswith(".nbs"):  # Binary snapshot of the halo on its own, made the first time it is needed, and
+        if os.path.exists(file_name):  # again whenever the options it was made from change.
+            parameters = SnapshotFile(file_name).header.get('parameters')
+            if parameters is None:
+                print("\nError. " + file_name + " does not say which halo it holds. Delete it to generate the halo.")
+                exit(1)
+            if parameters != live_dmh_parameters(galaxy_id):
+                print("The halo in", file_name, "was made from other options, so it is generated again.\n")
+                generate_live_dmh_file(file_name, galaxy_id)
+        else:
+            generate_live_dmh_file(file_name, galaxy_id)
+
+        frame = SnapshotSeries(file_name).frame(0)
+        if galaxy_id == primary:
+            objects.append(ParticleBlock(pri_dmh_name, np.array(frame.mass), frame.pos + [xg1, yg1, zg1],
+                                         frame.vel + [vxg1, vyg1, vzg1], ''))
+        elif galaxy_id == secondary:
+            objects.append(ParticleBlock(sec_dmh_name, np.array(frame.mass), frame.pos + [xg2, yg2, zg2],
+                                         frame.vel + [vxg2, vyg2, vzg2], ''))
+        count_live_dmh(len(frame), galaxy_id)
+        return
+
+    n = 0
     file = open(file_name, "r")
     for line in file:
+        n += 1
         data = line.strip().split()
         if galaxy_id == primary:
             objects.append(Body(pri_dmh_name, float(data[1]),
@@ -232,6 +265,7 @@ def read_dmh_file(file_name, galaxy_id):
                                 [xg2 + float(data[2]), yg2 + float(data[3]), zg2 + float(data[4])],
                                 [vxg2 + float(data[5]), vyg2 + float(data[6]), vzg2 + float(data[7])], ''))
     file.close()
+    count_live_dmh(n, galaxy_id)
 
 
 def read_dark_matter_halos():
@@ -251,204 +285,119 @@ def create_galaxies():
         objects.append(Body(sec_galaxy_name, mg2, [xg2, yg2, zg2], [vxg2, vyg2, vzg2], sec_galaxy_marker))
 
 
-def rotate_disk_particle(norm_spin, xyz_temp, v_xyz_temp):
-    xyz = []
-    v_xyz = []
+def disk_rotation(norm_spin):  # Matrix turning the plane z = 0 into the plane of a disk with the given spin.
+    if norm_spin[0] == 0 and norm_spin[1] == 0 and norm_spin[2] == 1:
+        return np.eye(3)
 
     alpha = math.acos(norm_spin[2])
     beta = math.asin(norm_spin[0] / math.sin(alpha))
-
-    xyz.append(xyz_temp[0] * math.cos(beta) + (xyz_temp[1] * math.cos(alpha) +
-                                               xyz_temp[2] * math.sin(alpha)) * math.sin(beta))
-    xyz.append(- xyz_temp[0] * math.sin(beta) + (xyz_temp[1] * math.cos(alpha) +
-                                                 xyz_temp[2] * math.sin(alpha)) * math.cos(beta))
-    xyz.append(- xyz_temp[1] * math.sin(alpha) + xyz_temp[2] * math.cos(alpha))
-
-    v_xyz.append(v_xyz_temp[0] * math.cos(beta) + (v_xyz_temp[1] * math.cos(alpha) +
-                                                   v_xyz_temp[2] * math.sin(alpha)) * math.sin(beta))
-    v_xyz.append(- v_xyz_temp[0] * math.sin(beta) + (v_xyz_temp[1] * math.cos(alpha) +
-                                                     v_xyz_temp[2] * math.sin(alpha)) * math.cos(beta))
-    v_xyz.append(- v_xyz_temp[1] * math.sin(alpha) + v_xyz_temp[2] * math.cos(alpha))
-
-    return xyz, v_xyz
+    return np.array([[math.cos(beta), math.cos(alpha) * math.sin(beta), math.sin(alpha) * math.sin(beta)],
+                     [- math.sin(beta), math.cos(alpha) * math.cos(beta), math.sin(alpha) * math.cos(beta)],
+                     [0, - math.sin(alpha), math.cos(alpha)]])
 
 
-def place_random_disk_particle(galaxy_id, norm_spin, theta, r, v):
-    xyz = []
-    v_xyz = []
+def disk_block(galaxy_id, theta, r, v):  # A galaxy's disk, from the angle, radius and circular speed of each
+    xyz = np.zeros((len(r), 3))  # particle, ready for the particle store.
+    xyz[:, 0] = r * np.cos(theta)
+    xyz[:, 1] = r * np.sin(theta)
 
-    xyz_temp = [(r * math.cos(theta)), (r * math.sin(theta)), 0]
-
-    v_xyz_temp = [(v * math.sin(theta)), (-v * math.cos(theta)), 0]
-
-    if norm_spin[0] == 0 and norm_spin[1] == 0 and norm_spin[2] == 1:
-        for i in range(len(xyz_temp)):
-            xyz.append(xyz_temp[i])
-            v_xyz.append(v_xyz_temp[i])
-
-    else:
-        xyz, v_xyz = rotate_disk_particle(norm_spin, xyz_temp, v_xyz_temp)
+    v_xyz = np.zeros((len(r), 3))
+    v_xyz[:, 0] = v * np.sin(theta)
+    v_xyz[:, 1] = -v * np.cos(theta)
 
     if galaxy_id == primary:
-        objects.append(Body(pri_disk_name, mdp1, [xg1 + xyz[0], yg1 + xyz[1], zg1 + xyz[2]],
-                            [vxg1 + v_xyz[0], vyg1 + v_xyz[1], vzg1 + v_xyz[2]], pri_disk_marker))
+        rotation = disk_rotation(norm_spin1).T
+        return ParticleBlock(pri_disk_name, np.full(len(r), float(mdp1)), xyz @ rotation + [xg1, yg1, zg1],
+                             v_xyz @ rotation + [vxg1, vyg1, vzg1], pri_disk_marker)
 
-    if galaxy_id == secondary:
-        objects.append(Body(sec_disk_name, mdp2, [xg2 + xyz[0], yg2 + xyz[1], zg2 + xyz[2]],
-                            [vxg2 + v_xyz[0], vyg2 + v_xyz[1], vzg2 + v_xyz[2]], sec_disk_marker))
+    rotation = disk_rotation(norm_spin2).T
+    return ParticleBlock(sec_disk_name, np.full(len(r), float(mdp2)), xyz @ rotation + [xg2, yg2, zg2],
+                         v_xyz @ rotation + [vxg2, vyg2, vzg2], sec_disk_marker)
 
 
-def return_random_disk_particle_velocity(galaxy_id, count, r):
+def return_random_disk_particle_velocity(galaxy_id, count, r):  # Works on single values or on arrays.
     v = 0
 
     if galaxy_id == primary:
         enclosed_mass1 = mg1 + (count * mdp1)
 
         if primary_dmh_potential:
-            v = math.sqrt((G * enclosed_mass1 / r) - ((G * M_vir1) / (math.log(1 + c1) - (c1 / (1 + c1)))) *
-                          (((r / (r + R_s1)) - (math.log(1 + (r / R_s1)))) / r))
+            v = np.sqrt((G * enclosed_mass1 / r) - r * dm_halos[primary].radial_acceleration(r))
         else:
-            v = math.sqrt(G * enclosed_mass1 / r)
+            v = np.sqrt(G * enclosed_mass1 / r)
 
     elif galaxy_id == secondary:
         enclosed_mass2 = mg2 + (count * mdp2)
 
         if secondary_dmh_potential:
-            v = math.sqrt((G * enclosed_mass2 / r) - ((G * M_vir2) / (math.log(1 + c2) - (c2 / (1 + c2)))) *
-                          (((r / (r + R_s2)) - (math.log(1 + (r / R_s2)))) / r))
+            v = np.sqrt((G * enclosed_mass2 / r) - r * dm_halos[secondary].radial_acceleration(r))
         else:
-            v = math.sqrt(G * enclosed_mass2 / r)
+            v = np.sqrt(G * enclosed_mass2 / r)
 
     return v
 
 
-def find_random_disk_particle_velocity(galaxy_id, saved_particles):
-    for i in range(len(saved_particles[1])):
-        count = 0
-        for j in range(len(saved_particles[1])):
-            if i == j:
-                continue
-            elif saved_particles[1][j] < saved_particles[1][i]:
-                count += 1
-        saved_particles[2].append(return_random_disk_particle_velocity(galaxy_id, count, saved_particles[1][i]))
-
+def find_random_disk_particle_velocities(galaxy_id, radii):
+    count = np.searchsorted(np.sort(radii), radii, side='left')  # Number of other particles closer to the centre.
+    return return_random_disk_particle_velocity(galaxy_id, count, radii)
 
-def generate_random_disk_particle_radius(galaxy_id, theta, saved_particles):
-    r = 0
-    prob = 0
 
+def generate_random_disk_particle_radii(galaxy_id, n):  # Draws n radii from the gaussian profile of the disk.
     if galaxy_id == primary:
-        r = dr1 * random.uniform(0.05, 1.0)
-        prob = (1 / (sigma1 * math.sqrt(2 * math.pi))) * math.exp(-0.5 * (((r / dr1) - mu1) / sigma1) ** 2)
-
-    elif galaxy_id == secondary:
-        r = dr2 * random.uniform(0.05, 1.0)
-        prob = (1 / (sigma2 * math.sqrt(2 * math.pi))) * math.exp(-0.5 * (((r / dr2) - mu2) / sigma2) ** 2)
-
-    rand_no = random.uniform(0, 1.0)
-
-    if rand_no <= prob:
-        saved_particles[1].append(r)
-
+        dr, mu, sigma = dr1, mu1, sigma1
     else:
-        generate_random_disk_particle_radius(galaxy_id, theta, saved_particles)
+        dr, mu, sigma = dr2, mu2, sigma2
 
+    radii = np.empty(0)
+    while len(radii) < n:  # Rejection sampling, in batches large enough to finish in a pass or two.
+        r = dr * np.random.uniform(0.05, 1.0, 2 * (n - len(radii)))
+        prob = (1 / (sigma * math.sqrt(2 * math.pi))) * np.exp(-0.5 * (((r / dr) - mu) / sigma) ** 2)
+        rand_no = np.random.uniform(0, 1.0, len(r))
+        radii = np.concatenate([radii, r[rand_no <= prob]])
 
-def create_random_disk(galaxy_id):
-    saved_particles = [[], [], []]
+    return radii[:n]
 
-    if galaxy_id == primary:
-        for i in range(0, tot_dp1):
-            theta = 2 * math.pi * i / tot_dp1
-            saved_particles[0].append(theta)
 
-            generate_random_disk_particle_radius(galaxy_id, theta, saved_particles)
-
-        find_random_disk_particle_velocity(galaxy_id, saved_particles)
-
-        for j in range(len(saved_particles[0])):
-            place_random_disk_particle(galaxy_id, norm_spin1, saved_particles[0][j], saved_particles[1][j],
-                                       saved_particles[2][j])
-
-    elif galaxy_id == secondary:
-        for i in range(0, tot_dp2):
-            theta = 2 * math.pi * i / tot_dp2
-            saved_particles[0].append(theta)
-
-            generate_random_disk_particle_radius(galaxy_id, theta, saved_particles)
+def create_random_disk(galaxy_id):
+    n = tot_dp1 if galaxy_id == primary else tot_dp2
 
-        find_random_disk_particle_velocity(galaxy_id, saved_particles)
+    theta = 2 * math.pi * np.arange(n) / n
+    r = generate_random_disk_particle_radii(galaxy_id, n)
+    v = find_random_disk_particle_velocities(galaxy_id, r)
 
-        for j in range(len(saved_particles[0])):
-            place_random_disk_particle(galaxy_id, norm_spin2, saved_particles[0][j], saved_particles[1][j],
-                                       saved_particles[2][j])
+    objects.append(disk_block(galaxy_id, theta, r, v))
 
 
-def find_ring_disk_particle_velocity(galaxy_id, r):
+def find_ring_disk_particle_velocity(galaxy_id, r):  # Works on single values or on arrays.
     v = 0
 
     if galaxy_id == primary:
         if primary_dmh_potential:
-            v = math.sqrt((G * mg1 / r) - ((G * M_vir1) / (math.log(1 + c1) - (c1 / (1 + c1)))) *
-                          (((r / (r + R_s1)) - (math.log(1 + (r / R_s1)))) / r))
+            v = np.sqrt((G * mg1 / r) - r * dm_halos[primary].radial_acceleration(r))
         else:
-            v = math.sqrt(G * mg1 / r)
+            v = np.sqrt(G * mg1 / r)
 
     elif galaxy_id == secondary:
         if secondary_dmh_potential:
-            v = math.sqrt((G * mg2 / r) - ((G * M_vir2) / (math.log(1 + c2) - (c2 / (1 + c2)))) *
-                          (((r / (r + R_s2)) - (math.log(1 + (r / R_s2)))) / r))
+            v = np.sqrt((G * mg2 / r) - r * dm_halos[secondary].radial_acceleration(r))
         else:
-            v = math.sqrt(G * mg2 / r)
+            v = np.sqrt(G * mg2 / r)
 
     return v
 
 
-def place_ring_disk_particle(galaxy_id, norm_spin, theta, r):
-    xyz = []
-    v_xyz = []
-
-    v = find_ring_disk_particle_velocity(galaxy_id, r)
-
-    xyz_temp = [(r * math.cos(theta)), (r * math.sin(theta)), 0]
-
-    v_xyz_temp = [(v * math.sin(theta)), (-v * math.cos(theta)), 0]
-
-    if norm_spin[0] == 0 and norm_spin[1] == 0 and norm_spin[2] == 1:
-        for i in range(len(xyz_temp)):
-            xyz.append(xyz_temp[i])
-            v_xyz.append(v_xyz_temp[i])
-
-    else:
-        xyz, v_xyz = rotate_disk_particle(norm_spin, xyz_temp, v_xyz_temp)
-
-    if galaxy_id == primary:
-        objects.append(Body(pri_disk_name, mdp1, [xg1 + xyz[0], yg1 + xyz[1], zg1 + xyz[2]],
-                            [vxg1 + v_xyz[0], vyg1 + v_xyz[1], vzg1 + v_xyz[2]], pri_disk_marker))
-
-    if galaxy_id == secondary:
-        objects.append(Body(sec_disk_name, mdp2, [xg2 + xyz[0], yg2 + xyz[1], zg2 + xyz[2]],
-                            [vxg2 + v_xyz[0], vyg2 + v_xyz[1], vzg2 + v_xyz[2]], sec_disk_marker))
-
-
 def create_ring_disk(galaxy_id):
     if galaxy_id == primary:
-        for k in range(0, no_rings1):
-            r = (k + 1) * ring_rad1
-            n = (k + 1) * no_rp1
+        no_rings, ring_rad, no_rp = no_rings1, ring_rad1, no_rp1
+    else:
+        no_rings, ring_rad, no_rp = no_rings2, ring_rad2, no_rp2
 
-            for i in range(0, n):
-                theta = 2 * math.pi * i / n
-                place_ring_disk_particle(galaxy_id, norm_spin1, theta, r)
+    n = (np.arange(no_rings) + 1) * no_rp  # Number of particles in each ring.
+    r = np.repeat((np.arange(no_rings) + 1) * ring_rad, n)
+    i = np.arange(np.sum(n)) - np.repeat(np.cumsum(n) - n, n)  # Place of each particle around its ring.
+    theta = 2 * math.pi * i / np.repeat(n, n)
 
-    elif galaxy_id == secondary:
-        for k in range(0, no_rings2):
-            r = (k + 1) * ring_rad2
-            n = (k + 1) * no_rp2
-
-            for i in range(0, n):
-                theta = 2 * math.pi * i / n
-                place_ring_disk_particle(galaxy_id, norm_spin2, theta, r)
+    objects.append(disk_block(galaxy_id, theta, r, find_ring_disk_particle_velocity(galaxy_id, r)))
 
 
 def create_galaxy_disks():
@@ -468,73 +417,208 @@ def create_galaxy_disks():
 #######################################################################################################################
 
 
-def find_dynamical_friction(bodies, galaxy_id):
-    for body in bodies:
-        if galaxy_id == primary:
-            other = objects[find_galaxy(pri_galaxy_name)]
-            if body.name == sec_galaxy_name or body.name == sec_disk_name:
-                body.calculate_dynamical_friction(other, galaxy_id)
-            else:
-                continue
+def find_galaxy(particles, galaxy_name):  # Looked up in the particle store's component index.
+    return particles.index_of(galaxy_name)
 
-        if galaxy_id == secondary:
-            other = objects[find_galaxy(sec_galaxy_name)]
-            if body.name == pri_galaxy_name or body.name == pri_disk_name:
-                body.calculate_dynamical_friction(other, galaxy_id)
-            else:
-                continue
 
+def build_particle_set(bodies):
+    global objects
+    particles = ParticleSet.from_bodies(bodies, type_names, type_colours)
+    if massless_disks:
+        particles.set_tracers(particles.type_mask([pri_disk_name, sec_disk_name]))
+    objects = particles.views()  # Remaining code reading objects[i].xyz or .name sees the particle store.
+    return particles
 
-def find_dmh_acceleration(bodies, galaxy_list_position, galaxy_id, total_energies):
-    other = objects[galaxy_list_position]
-    for body in bodies:
-        if body is other:
-            continue
-        else:
-            body.calculate_dmh_acceleration(other, galaxy_id)
-            if calc_energy:
-                total_energies[1] += body.calculate_dmh_potential_energy(other)
 
+def build_recorder(particles):
+    centres = particles.members([pri_galaxy_name, sec_galaxy_name])  # Galaxy centres are always recorded.
+    recorded = centres
+    if record_policy == "all":
+        recorded = np.arange(len(particles))
+    elif record_policy == "tracers" and record_tracers > 0:
+        tracers = particles.tracer_index
+        if len(tracers) == 0:  # Disks with mass are followed instead, when there are no massless tracers.
+            tracers = particles.members([pri_disk_name, sec_disk_name])
+        spacing = max(1, len(tracers) // record_tracers)
+        recorded = np.union1d(centres, tracers[::spacing][:record_tracers])
+
+    # Only the centres' velocities are used, for the relative velocity of the galaxies.
+    return TrajectoryRecorder(recorded, int(round(no_step)), record_cadence, centres)
+
+
+#######################################################################################################################
+
+
+def calculate_dynamical_friction(particles, rows, other, causing_galaxy_id):  # Friction on every particle in rows.
+    r_xyz = particles.pos[rows] - particles.pos[other]
+    r = np.sqrt(np.sum(r_xyz ** 2, axis=1))
+    v_xyz = particles.vel[rows] - particles.vel[other]
+    v = np.sqrt(np.sum(v_xyz ** 2, axis=1))
+
+    density_distribution = 0
+    v_dispersion = 0
+
+    # epsilon = (0.98 * (3002 ** -0.26)) * kpc
+    epsilon = 28.5 * kpc
+    ln_lambda = np.log(r / (1.4 * epsilon))
+
+    if causing_galaxy_id == primary:
+        density_distribution = (102 * critical_density) / ((r / R_s1) * (1 + (r / R_s1)) ** 2)
+        v_dispersion = V_max1 * ((1.4393 * (r / R_s1) ** 0.354) / (1 + 1.1756 * (r / R_s1) ** 0.725))
+
+    elif causing_galaxy_id == secondary:
+        density_distribution = rho_zero2 / ((r / R_s2) * (1 + (r / R_s2)) ** 2)
+        v_dispersion = V_max2 * ((1.4393 * (r / R_s2) ** 0.354) / (1 + 1.1756 * (r / R_s2) ** 0.725))
+
+    X = v / ((2 ** 0.5) * v_dispersion)
+
+    a = - ((4 * math.pi * (G ** 2) * particles.mass[rows] * ln_lambda * density_distribution) / (v ** 2)) * (
+            erf(X) - (2 * X / (math.pi ** 0.5)) * np.exp(-(X ** 2)))
+
+    particles.acc[rows] += (a / v)[:, np.newaxis] * v_xyz
 
-def find_all_dmh_accelerations(bodies, total_energies):
+
+def find_dynamical_friction(particles, galaxy_id, targets=None):
+    if galaxy_id == primary:
+        other = find_galaxy(particles, pri_galaxy_name)  # Found once, for every particle feeling the friction.
+        rows = particles.members([sec_galaxy_name, sec_disk_name])
+    else:
+        other = find_galaxy(particles, sec_galaxy_name)
+        rows = particles.members([pri_galaxy_name, pri_disk_name])
+
+    if targets is not None:
+        active = np.zeros(len(particles), dtype=bool)
+        active[targets] = True
+        rows = rows[active[rows]]
+
+    if len(rows) > 0:
+        calculate_dynamical_friction(particles, rows, other, galaxy_id)
+
+
+def find_dmh_acceleration(particles, galaxy_list_position, galaxy_id, total_energies, targets=None):
+    halo = dm_halos[galaxy_id]
+    centre = particles.pos[galaxy_list_position]
+    rows = slice(None) if targets is None else targets
+
+    particles.acc[rows] += halo.acceleration(particles.pos[rows], centre)
+
+    if calc_energy and targets is None:
+        total_energies[1] += np.sum(halo.potential(particles.pos, centre) * (particles.mass / 2))
+
+
+def find_all_dmh_accelerations(particles, total_energies, targets=None):
     if primary_dmh_potential:
-        pri = find_galaxy(pri_galaxy_name)
-        find_dmh_acceleration(bodies, pri, primary, total_energies)
+        pri = find_galaxy(particles, pri_galaxy_name)
+        find_dmh_acceleration(particles, pri, primary, total_energies, targets)
 
     if secondary_dmh_potential:
-        sec = find_galaxy(sec_galaxy_name)
-        find_dmh_acceleration(bodies, sec, secondary, total_energies)
+        sec = find_galaxy(particles, sec_galaxy_name)
+        find_dmh_acceleration(particles, sec, secondary, total_energies, targets)
 
 
-def find_newtonian_gravitation(bodies, total_energies):
-    for body in bodies:
-        for other in bodies:
-            if body is other:
-                continue
-            else:
-                if (other.name != pri_disk_name) and (other.name != sec_disk_name):
-                    body.calculate_newtonian_acceleration(other)
-                if calc_energy:
-                    total_energies[1] += body.calculate_potential_energy(other)
-                else:
-                    continue
+def find_tree_gravitation(particles, total_energies, targets=None):
+    sources = particles.source_index
+    soft = soft_param if softening else 0
+    rows = slice(None) if targets is None else targets
+    energy = calc_energy and targets is None
+
+    tree = Octree(particles.pos[sources], particles.mass[sources], tree_leaf_size, tree_quadrupole)
+    acc, phi = tree.acceleration(particles.pos[rows], tree_theta, soft, energy)
+    particles.acc[rows] += acc
 
+    if energy:
+        total_energies[1] += np.sum(phi * (particles.mass / 2))
 
-def find_all_accelerations(bodies, total_energies):
-    for body in bodies:
-        for i in range(len(body.a_xyz)):
-            body.a_xyz[i] = 0
 
-    if newtonian_gravity:
-        find_newtonian_gravitation(bodies, total_energies)
+def find_mesh_gravitation(particles, total_energies, targets=None):
+    sources = particles.source_index
+    soft = soft_param if softening else 0
+    rows = slice(None) if targets is None else targets
+    energy = calc_energy and targets is None
 
-    if primary_dmh_potential or secondary_dmh_potential:
-        find_all_dmh_accelerations(bodies, total_energies)
+    pri = find_galaxy(particles, pri_galaxy_name)
+    sec = find_galaxy(particles, sec_galaxy_name)
+    centre = (particles.pos[pri] + particles.pos[sec]) / 2  # Centre of the interacting pair.
+
+    self_mass = np.zeros(len(particles))
+    self_mass[sources] = particles.mass[sources]
+
+    acc, phi = particle_mesh.acceleration(particles.pos[rows], particles.pos[sources], particles.mass[sources], soft,
+                                          energy, centre, self_mass[rows])
+    particles.acc[rows] += acc
+
+    if energy:
+        total_energies[1] += np.sum(phi * (particles.mass / 2))
+
+
+def find_direct_gravitation(particles, total_energies, targets=None):
+    sources = particles.source_index
+    soft = soft_param if softening else 0
+    rows = slice(None) if targets is None else targets
+
+    particles.acc[rows] += direct_acceleration(particles.pos[rows], particles.pos[sources], particles.mass[sources],
+                                               soft)
+
+    if calc_energy and targets is None:
+        total_energies[1] += direct_potential_energy(particles.pos, particles.mass, particles.pos[sources],
+                                                     particles.mass[sources])
+
+
+def find_newtonian_gravitation(particles, total_energies, targets=None):
+    if gravity_solver == "tree":
+        find_tree_gravitation(particles, total_energies, targets)
+    elif gravity_solver == "pm":
+        find_mesh_gravitation(particles, total_energies, targets)
+    else:
+        find_direct_gravitation(particles, total_energies, targets)
+
+
+def start_force_pool(particles):
+    global force_pool
+    halos = []  # Each halo with the position of its galaxy in the particle store, which does not change.
+    if primary_dmh_potential:
+        halos.append((dm_halos[primary], find_galaxy(particles, pri_galaxy_name)))
+    if secondary_dmh_potential:
+        halos.append((dm_halos[secondary], find_galaxy(particles, sec_galaxy_name)))
+
+    settings = {'solver': gravity_solver if newtonian_gravity else None, 'soft': soft_param if softening else 0,
+                'theta': tree_theta, 'quadrupole': tree_quadrupole, 'leaf_size': tree_leaf_size, 'halos': halos,
+                'energy': calc_energy}
+    force_pool = ForcePool(particles, force_workers, settings)
+
+
+def stop_force_pool():
+    global force_pool
+    force_pool.close()
+    force_pool = None
+
+
+def find_all_accelerations(particles, total_energies, targets=None):  # Targets limits the forces to some particles.
+    if targets is None:
+        particles.acc[:] = 0
+    else:
+        particles.acc[targets] = 0
+
+    if force_pool is not None:
+        if newtonian_gravity and gravity_solver == "pm":  # The mesh is solved here, the halos by the workers.
+            find_mesh_gravitation(particles, total_energies, targets)
+        force_pool.evaluate(total_energies, targets)
+
+    else:
+        if newtonian_gravity:
+            find_newtonian_gravitation(particles, total_energies, targets)
+
+        if primary_dmh_potential or secondary_dmh_potential:
+            find_all_dmh_accelerations(particles, total_energies, targets)
 
     if primary_dynamical_friction:
-        find_dynamical_friction(bodies, primary)
+        find_dynamical_friction(particles, primary, targets)
     if secondary_dynamical_friction:
-        find_dynamical_friction(bodies, secondary)
+        find_dynamical_friction(particles, secondary, targets)
+
+
+def calculate_kinetic_energy(particles):
+    return np.sum(0.5 * particles.mass * np.sum(particles.vel ** 2, axis=1))
 
 
 #######################################################################################################################
@@ -558,84 +642,255 @@ def append_energies(step_ke, step_pe, total_energies):
 #######################################################################################################################
 
 
-def file_print_all_particles(bodies, file_name):
+def file_print_all_particles(particles, file_name):
     file = open(file_name, "w+")
-    for body in bodies:
-        file.write("{0} {1} {2} {3} {4} {5} {6} {7} {8}\n".format(body.name, body.m, body.xyz[0], body.xyz[1],
-                                                                  body.xyz[2], body.v_xyz[0], body.v_xyz[1],
-                                                                  body.v_xyz[2], body.colour))
+    for i in range(len(particles)):
+        file.write("{0} {1} {2} {3} {4} {5} {6} {7} {8}\n".format(particles.name(i), particles.mass[i],
+                                                                  particles.pos[i, 0], particles.pos[i, 1],
+                                                                  particles.pos[i, 2], particles.vel[i, 0],
+                                                                  particles.vel[i, 1], particles.vel[i, 2],
+                                                                  particles.colour(i)))
     file.close()
 
 
-def time_file_print_particles(bodies, step):
-    txt_title = step * time_step / Gyr
+def open_snapshot_file(particles, resume_step=None):
+    global snapshot_writer
+    snapshot_writer = SnapshotWriter(snapshot_file_name(rewind), particles, time_step, resume_step)
 
-    if rewind:
-        file_print_all_particles(bodies, "Backwards/rimage_%.5f.txt" % txt_title)
+
+def close_snapshot_file():
+    global snapshot_writer
+    snapshot_writer.close()
+    snapshot_writer = None
+
+
+def start_snapshot_queue():
+    global snapshot_queue
+    snapshot_queue = BackgroundWriter(write_snapshot, snapshot_queue_size, snapshot_queue_timeout)
+
+
+def stop_snapshot_queue():
+    global snapshot_queue
+    writer = snapshot_queue
+    snapshot_queue = None
+    writer.close()
+
+
+def write_snapshot(particles, time, step):  # Particles can be the particle store or a copied frame of it.
+    if snapshot_format == "binary":
+        snapshot_writer.write(particles, time, step)
+    else:
+        file_print_all_particles(particles, image_file_name(time / Gyr, rewind))
+
+
+def time_file_print_particles(particles, step):
+    if snapshot_queue is not None:
+        snapshot_queue.put(copy_frame(particles, step * time_step, step))
     else:
-        file_print_all_particles(bodies, "Forwards/image_%.5f.txt" % txt_title)
+        write_snapshot(particles, step * time_step, step)
 
 
 #######################################################################################################################
 
 
-def initial_leapfrog_step(bodies, step, step_ke, step_pe):
-    time_file_print_particles(bodies, step)
+def initial_leapfrog_step(particles, recorder, step, step_ke, step_pe):
+    time_file_print_particles(particles, step)
 
     total_energies = [0, 0]
 
-    for body in bodies:
-        for i in range(len(body.saved_xyz)):
-            body.saved_xyz[i].append(body.xyz[i])
-            if body.name == pri_galaxy_name or body.name == sec_galaxy_name:
-                body.saved_v_xyz[i].append(body.v_xyz[i])
+    recorder.record_positions(particles, step)
+    recorder.record_velocities(particles, step)
 
-        if calc_energy:
-            total_energies[0] += body.calculate_kinetic_energy()
+    if calc_energy:
+        total_energies[0] += calculate_kinetic_energy(particles)
 
-    find_all_accelerations(bodies, total_energies)
+    find_all_accelerations(particles, total_energies)
+
+    if block_timesteps:
+        particles.level[:] = find_block_levels(particles, find_block_references(particles), np.arange(len(particles)))
 
     if calc_energy:
         append_energies(step_ke, step_pe, total_energies)
 
 
-def leapfrog_step(bodies, step, step_ke, step_pe):
+def integrator_step(particles, recorder, step, step_ke, step_pe):  # One step of the chosen integrator.
     total_energies = [0, 0]
+    part_energies = [0, 0]  # Energies found part way through a step, which are not kept.
+    scheme = integrators[integrator]
+
+    drifted = False  # Whether the particles have drifted since their forces were last found.
+    for stage, (kind, fraction) in enumerate(scheme.stages):
+        if kind == "drift":
+            particles.pos += particles.vel * (time_step * fraction)
+            drifted = True
+            continue
 
-    for body in bodies:
-        for i in range(len(body.a_xyz)):
-            body.v_xyz[i] += body.a_xyz[i] * (time_step / 2)
-            body.xyz[i] += body.v_xyz[i] * time_step
-            body.saved_xyz[i].append(body.xyz[i])
+        if drifted:
+            if scheme.synchronised(stage):  # Positions are at the end of the step.
+                recorder.record_positions(particles, step)
+                find_all_accelerations(particles, total_energies)
+            else:
+                find_all_accelerations(particles, part_energies)
+            drifted = False
+        particles.vel += particles.acc * (time_step * fraction)
 
-    find_all_accelerations(bodies, total_energies)
+    if drifted:  # Schemes ending on a drift only need the forces here to find the potential energy.
+        recorder.record_positions(particles, step)
+        if calc_energy:
+            find_all_accelerations(particles, total_energies)
+    recorder.record_velocities(particles, step)
 
-    for body in bodies:
-        for i in range(len(body.a_xyz)):
-            body.v_xyz[i] += body.a_xyz[i] * (time_step / 2)
-            if body.name == pri_galaxy_name or body.name == sec_galaxy_name:
-                body.saved_v_xyz[i].append(body.v_xyz[i])
+    if calc_energy:
+        total_energies[0] += calculate_kinetic_energy(particles)
+        append_energies(step_ke, step_pe, total_energies)
 
-        if calc_energy:
-            total_energies[0] += body.calculate_kinetic_energy()
+    if step % int(interval) == 0:
+        time_file_print_particles(particles, step)
+
+
+def find_block_references(particles):  # Particle that each particle's motion is measured against when choosing steps.
+    references = np.arange(len(particles))
+    pri = find_galaxy(particles, pri_galaxy_name)
+    sec = find_galaxy(particles, sec_galaxy_name)
+    references[particles.members([pri_disk_name, pri_dmh_name])] = pri
+    references[particles.members([sec_disk_name, sec_dmh_name])] = sec
+    if primary_gal and secondary_gal:
+        references[pri] = sec
+        references[sec] = pri
+    return references
+
+
+def find_block_levels(particles, references, targets):  # Level of the block step each target needs.
+    dv = np.sqrt(np.sum((particles.vel[targets] - particles.vel[references[targets]]) ** 2, axis=1))
+    da = np.sqrt(np.sum((particles.acc[targets] - particles.acc[references[targets]]) ** 2, axis=1))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        steps = block_eta * dv / da  # Time for the relative velocity to change by a fraction block_eta of itself.
+        steps[da == 0] = np.inf
+        levels = np.ceil(np.log2(abs(time_step) / steps))
+    return np.clip(levels, 0, max_block_level).astype(np.int64)
+
+
+def block_leapfrog_step(particles, recorder, step, step_ke, step_pe):  # Leapfrog with steps of time_step / 2 ** level.
+    total_energies = [0, 0]
+    references = find_block_references(particles)
+
+    n_sub = 2 ** max_block_level  # Number of the shortest block steps in one full step.
+    spans = n_sub >> particles.level  # Number of shortest block steps in each particle's own step.
+    m = 0
+    while m < n_sub:
+        starting = np.flatnonzero(m % spans == 0)
+        particles.vel[starting] += particles.acc[starting] * (time_step * spans[starting] / n_sub / 2)[:, np.newaxis]
+
+        stride = int(np.min(spans))  # Every particle is drifted up to the next end of a step.
+        particles.pos += particles.vel * (time_step * stride / n_sub)
+        m += stride
+
+        if m == n_sub:  # Every particle is synchronised at the end of the full step.
+            recorder.record_positions(particles, step)
+            ending = np.arange(len(particles))
+            find_all_accelerations(particles, total_energies)
+        else:
+            ending = np.flatnonzero(m % spans == 0)
+            find_all_accelerations(particles, total_energies, ending)  # Forces only on particles ending a step.
+
+        particles.vel[ending] += particles.acc[ending] * (time_step * spans[ending] / n_sub / 2)[:, np.newaxis]
+
+        levels = find_block_levels(particles, references, ending)
+        if m < n_sub:  # A particle can only move to a longer step if that step would also start here.
+            levels = np.maximum(levels, max_block_level - ((m & -m).bit_length() - 1))
+        particles.level[ending] = levels
+        spans = n_sub >> particles.level
+
+    recorder.record_velocities(particles, step)
 
     if calc_energy:
+        total_energies[0] += calculate_kinetic_energy(particles)
         append_energies(step_ke, step_pe, total_energies)
 
     if step % int(interval) == 0:
-        time_file_print_particles(bodies, step)
+        time_file_print_particles(particles, step)
+
+
+def save_run_checkpoint(particles, recorder, step, step_ke, step_pe):
+    if snapshot_queue is not None:
+        snapshot_queue.wait()  # Every image up to this step is written before the checkpoint is.
+
+    arrays = {'step': np.array(step), 'step_ke': np.array(step_ke, dtype=float),
+              'step_pe': np.array(step_pe, dtype=float), 'time_step': np.array(time_step),
+              'no_step': np.array(no_step), 'integrator': np.array(integrator), 'pos': particles.pos,
+              'vel': particles.vel, 'acc': particles.acc, 'mass': particles.mass, 'type': particles.type,
+              'pid': particles.pid, 'level': particles.level, 'source_index': particles.source_index,
+              'tracer_index': particles.tracer_index}
+    arrays.update(recorder.checkpoint())
+    arrays.update(random_states())
+
+    save_checkpoint(checkpoint_file_name(step, rewind), arrays)
+    prune_checkpoints(checkpoints_kept, rewind)
+
 
+def load_run_checkpoint(particles, recorder):  # Puts the run back as it was at its newest checkpoint.
+    steps = list_checkpoints(rewind)
+    if len(steps) == 0:
+        print("\nError. There is no checkpoint to resume from in " + checkpoint_directory(rewind) + ".")
+        exit(1)
+    arrays = load_checkpoint(checkpoint_file_name(steps[-1], rewind))
+    if len(arrays['pid']) != len(particles) or arrays['time_step'] != time_step or arrays['no_step'] != no_step \
+            or str(arrays['integrator']) != integrator:
+        print("\nError. The checkpoint was made with different particles, time steps or integrator to these options.")
+        exit(1)
 
-def leapfrog_loop(bodies):
+    particles.pos[:] = arrays['pos']
+    particles.vel[:] = arrays['vel']
+    particles.acc[:] = arrays['acc']
+    particles.mass[:] = arrays['mass']
+    particles.type[:] = arrays['type']
+    particles.index_components()
+    particles.pid[:] = arrays['pid']
+    particles.level[:] = arrays['level']
+    particles.source_index = arrays['source_index']
+    particles.tracer_index = arrays['tracer_index']
+    recorder.restore(arrays)
+    set_random_states(arrays)
+
+    print("Resuming from step", int(arrays['step']), "of", int(round(no_step)), ".")
+    return int(arrays['step']), arrays['step_ke'].tolist(), arrays['step_pe'].tolist()
+
+
+def leapfrog_loop(particles, recorder):
+    resume_from = load_run_checkpoint(particles, recorder) if resume else None
+    if snapshot_format == "binary":
+        open_snapshot_file(particles, None if resume_from is None else resume_from[0])
+    if async_snapshots:
+        start_snapshot_queue()
+    if force_workers > 1:
+        start_force_pool(particles)
+    try:
+        run_leapfrog(particles, recorder, resume_from)
+    finally:
+        if force_pool is not None:
+            stop_force_pool()
+        try:
+            if snapshot_queue is not None:
+                stop_snapshot_queue()
+        finally:
+            if snapshot_writer is not None:
+                close_snapshot_file()
+
+
+def run_leapfrog(particles, recorder, resume_from=None):  # Resume_from is the step and energies of a checkpoint.
     step = 0
     step_ke = []
     step_pe = []
     percent_time_start = 0
 
     print("Calculating...")
-    initial_leapfrog_step(bodies, step, step_ke, step_pe)
+    if resume_from is None:
+        initial_leapfrog_step(particles, recorder, step, step_ke, step_pe)
+    else:
+        step, step_ke, step_pe = resume_from
 
-    percent = 0.0
+    percent = float(sum(1 for a in range(100) if 0 < (a * no_step) / 100 <= step))
     print(percent)
     while True:
         step += 1
@@ -653,54 +908,64 @@ def leapfrog_loop(bodies):
                           (average_percent_time * 98) / 60, " minutes.")
 
         if step == no_step:
-            time_file_print_particles(bodies, step)
+            time_file_print_particles(particles, step)
             if calc_energy:
                 file_print_energies(step_ke, step_pe)
             return
 
+        elif block_timesteps:
+            block_leapfrog_step(particles, recorder, step, step_ke, step_pe)
+
         else:
-            leapfrog_step(bodies, step, step_ke, step_pe)
+            integrator_step(particles, recorder, step, step_ke, step_pe)
+
+        if checkpoint_interval > 0 and step % checkpoint_interval == 0:
+            save_run_checkpoint(particles, recorder, step, step_ke, step_pe)
 
 
 #######################################################################################################################
 
 
-def file_print_path(file_name, galaxy_list_position):
+def file_print_path(file_name, recorder, galaxy_list_position):
     file = open(file_name, "w+")
 
-    for i in range(len(objects[galaxy_list_position].saved_xyz[0])):
-        file.write("{0} {1} {2}\n".format(objects[galaxy_list_position].saved_xyz[0][i],
-                                          objects[galaxy_list_position].saved_xyz[1][i],
-                                          objects[galaxy_list_position].saved_xyz[2][i]))
+    for pos in recorder.positions(galaxy_list_position):
+        file.write("{0} {1} {2}\n".format(pos[0], pos[1], pos[2]))
     file.close()
 
 
-def file_print_galaxy_paths():
+def file_print_galaxy_paths(particles, recorder):
     if primary_gal:
-        pri = find_galaxy(pri_galaxy_name)
+        pri = find_galaxy(particles, pri_galaxy_name)
         if rewind:
-            file_print_path("Backwards/RWPriGalPath.txt", pri)
+            file_print_path("Backwards/RWPriGalPath.txt", recorder, pri)
         else:
-            file_print_path("Forwards/PriGalPath.txt", pri)
+            file_print_path("Forwards/PriGalPath.txt", recorder, pri)
 
     if secondary_gal:
-        sec = find_galaxy(sec_galaxy_name)
+        sec = find_galaxy(particles, sec_galaxy_name)
         if rewind:
-            file_print_path("Backwards/RWSecGalPath.txt", sec)
+            file_print_path("Backwards/RWSecGalPath.txt", recorder, sec)
         else:
-            file_print_path("Forwards/SecGalPath.txt", sec)
+            file_print_path("Forwards/SecGalPath.txt", recorder, sec)
+
+    if record_policy != "centres":
+        if rewind:
+            recorder.save("Backwards/RWRecordedPaths.npz", particles)
+        else:
+            recorder.save("Forwards/RecordedPaths.npz", particles)
 
 
 #######################################################################################################################
 
 
-def plot_galaxy_separation(separations, rel_velocities):
+def plot_galaxy_separation(separations, rel_velocities, steps):
     time_steps = []
 
     for k in range(len(separations)):
         separations[k] = separations[k] / kpc
         rel_velocities[k] = rel_velocities[k] / km_s
-        time_steps.append(k * time_step / Gyr)
+        time_steps.append(steps[k] * time_step / Gyr)
 
     fig, ax = plt.subplots()
     ax.plot(time_steps, separations, 'r-', label='Relative Distance', linewidth=8)
@@ -719,27 +984,21 @@ def plot_galaxy_separation(separations, rel_velocities):
     plt.show()
 
 
-def find_separations_and_relative_velocity(separations, rel_velocities):
-    xyz_pc = [None] * 3
-    v_xyz_pc = [None] * 3
-
-    pri = find_galaxy(pri_galaxy_name)
-    sec = find_galaxy(sec_galaxy_name)
+def find_separations_and_relative_velocity(particles, recorder, separations, rel_velocities):
+    pri = find_galaxy(particles, pri_galaxy_name)
+    sec = find_galaxy(particles, sec_galaxy_name)
 
-    for i in range(len(objects[pri].saved_xyz[0])):
-        for j in range(len(xyz_pc)):
-            xyz_pc[j] = (objects[pri].saved_xyz[j][i] - objects[sec].saved_xyz[j][i]) ** 2
-            v_xyz_pc[j] = (objects[pri].saved_v_xyz[j][i] - objects[sec].saved_v_xyz[j][i]) ** 2
-        separations.append(math.sqrt(xyz_pc[0] + xyz_pc[1] + xyz_pc[2]))
-        rel_velocities.append(math.sqrt(v_xyz_pc[0] + v_xyz_pc[1] + v_xyz_pc[2]))
+    separations.extend(np.sqrt(np.sum((recorder.positions(pri) - recorder.positions(sec)) ** 2, axis=1)).tolist())
+    rel_velocities.extend(np.sqrt(np.sum((recorder.velocities(pri) - recorder.velocities(sec)) ** 2,
+                                         axis=1)).tolist())
 
 
-def calculate_separation_info():
+def calculate_separation_info(particles, recorder):
     separations = []
     post_pc_separations = []
     rel_velocities = []
 
-    find_separations_and_relative_velocity(separations, rel_velocities)
+    find_separations_and_relative_velocity(particles, recorder, separations, rel_velocities)
 
     pericentre = min(separations)
     pericentre_position = separations.index(min(separations))
@@ -752,18 +1011,18 @@ def calculate_separation_info():
     apocentre = max(post_pc_separations) / kpc
     print("\n\nThe apocentre was:", apocentre, "kpc.\n")
 
-    time_of_pericentre = ((separations.index(min(separations)) + 1) * time_step) / Gyr
+    time_of_pericentre = ((recorder.steps[pericentre_position] + 1) * time_step) / Gyr
     if gal_sep_plot:
-        plot_galaxy_separation(separations, rel_velocities)
+        plot_galaxy_separation(separations, rel_velocities, recorder.recorded_steps())
 
     return pericentre, time_of_pericentre
 
 
-def print_interaction_info():
+def print_interaction_info(particles, recorder):
     pericentre = 0
     time_of_pericentre = 0
     if not primary_isolation and not secondary_isolation:
-        pericentre, time_of_pericentre = calculate_separation_info()
+        pericentre, time_of_pericentre = calculate_separation_info(particles, recorder)
     total_time = (time.time() - start_time) / 60
 
     print("\nRuntime: %.2f minutes.\n" % total_time)
@@ -793,50 +1052,70 @@ def isolation_simulation():
     create_galaxies()
     create_galaxy_disks()
 
-    leapfrog_loop(objects)
-    print_interaction_info()
+    particles = build_particle_set(objects)
+    recorder = build_recorder(particles)
+
+    leapfrog_loop(particles, recorder)
+    print_interaction_info(particles, recorder)
 
     if primary_isolation:
-        file_print_all_particles(objects, "Primary_Galaxy.txt")
+        file_print_all_particles(particles, "Primary_Galaxy.txt")
         print("The primary galaxy was simulated in isolation.\n")
     elif secondary_isolation:
-        file_print_all_particles(objects, "Secondary_Galaxy.txt")
+        file_print_all_particles(particles, "Secondary_Galaxy.txt")
         print("The secondary galaxy was simulated in isolation.\n")
 
 
 def file_simulation():
     read_file("Initial_Conditions.txt")
 
-    leapfrog_loop(objects)
+    particles = build_particle_set(objects)
+    recorder = build_recorder(particles)
 
-    file_print_galaxy_paths()
-    print_interaction_info()
+    leapfrog_loop(particles, recorder)
+
+    file_print_galaxy_paths(particles, recorder)
+    print_interaction_info(particles, recorder)
 
 
 def galaxy_files_simulation():
     read_galaxy_file("Primary_Galaxy.txt")
     read_galaxy_file("Secondary_Galaxy.txt")
+    read_dark_matter_halos()
+
+    particles = build_particle_set(objects)
+    recorder = build_recorder(particles)
 
-    leapfrog_loop(objects)
+    leapfrog_loop(particles, recorder)
 
-    file_print_galaxy_paths()
-    print_interaction_info()
+    file_print_galaxy_paths(particles, recorder)
+    print_interaction_info(particles, recorder)
 
 
 def generate_simulation():
     create_galaxies()
     create_galaxy_disks()
+    read_dark_matter_halos()
+
+    particles = build_particle_set(objects)
+    recorder = build_recorder(particles)
 
-    leapfrog_loop(objects)
+    leapfrog_loop(particles, recorder)
 
-    file_print_galaxy_paths()
-    print_interaction_info()
+    file_print_galaxy_paths(particles, recorder)
+    print_interaction_info(particles, recorder)
 
 
 #######################################################################################################################
 
 
-def main():
+def main(config=None, resume_run=False):  # Runs the simulation of a SimulationConfig, or else of the command line's
+    global resume  # --config file and name=value options, carrying on from a checkpoint with resume_run or --resume.
+    if config is None:
+        config = SimulationConfig.from_arguments(sys.argv[1:])
+        resume_run = resume_run or "--resume" in sys.argv[1:]
+    configure(config)
+    resume = resume_run
 
     option_checks()
     make_directories()
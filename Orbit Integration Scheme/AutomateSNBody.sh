@@ -1,5 +1,8 @@
 #!/bin/bash
 
+# Runs one process per initial condition. The same sweep runs in one process with: python ./StrippedNBody.py --batch
+# or across every core, carrying on where a stopped sweep left off, with: python ./SweepRunner.py
+
 let v=10000
 let max_v=60000
 let max=12
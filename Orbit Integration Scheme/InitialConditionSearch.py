@@ -0,0 +1,157 @@
+import sys
+import time
+import numpy as np
+import StrippedNBody
+
+# Target, a pericentre as found by OISAnalysis.find_min_pericentre_time, and how close a solution has to come to it:
+target_pericentre = 37.73  # Pericentre, in kpc.
+target_time = 0.2234  # Lookback time of the pericentre, in Gyrs.
+target_separation = 50  # Present separation of the galaxies, in kpc, as given to StrippedNBody.
+pericentre_tolerance = 0.002  # Largest difference from the target pericentre of a solution, in kpc.
+time_tolerance = 0.00002  # Largest difference from the target time of a solution, in Gyrs.
+
+# Search options:
+coarse_samples = 4096  # Number of random velocities tried first, across the velocities of the AutomateSNBody.sh grid.
+starts = 64  # Number of the best of those refined, each by its own Nelder-Mead simplex.
+initial_step = 2000  # Size of each starting simplex, in m/s.
+converged_error = 0.01  # Error, in squared tolerances, at which a simplex stops.
+smallest_step = 0.01  # Size of simplex, in m/s, at which a simplex stops.
+max_iterations = 400  # Largest number of Nelder-Mead steps.
+search_margin = 0.05  # Time integrated past the target time when checking solutions, in Gyrs.
+solution_file = "Search_Solutions.txt"  # File the solutions are written to, in the columns of Automation_Data.txt,
+# with the positions and velocities at the end of the search window. Every orbit of this model goes on to merge, so
+# the pericentre looked for is the first one, inside the window, not the smallest of the whole run.
+
+start_time = time.time()  # Sets start time in order to find runtime of program.
+
+
+def target_step():  # Step of StrippedNBody at the target time.
+    return int(round(target_time * StrippedNBody.Gyr / abs(StrippedNBody.time_step)))
+
+
+def window_steps():  # Steps up to a little past the target time, enough to find a pericentre there.
+    return int(round((target_time + search_margin) * StrippedNBody.Gyr / abs(StrippedNBody.time_step)))
+
+
+def stop_below():  # Orbits closer than this, in metres, already have too small a pericentre.
+    return (target_pericentre - pericentre_tolerance) * StrippedNBody.kpc
+
+
+def evaluate(velocities):  # Errors of each (vx, vy, vz), in squared tolerances, from the separation and relative
+    if len(velocities) == 0:  # velocity at the target time. The closest approach of the galaxies moving in straight
+        return np.zeros(0)  # lines from there stands in for the pericentre, as it changes smoothly with the velocities
+    # where the step of the smallest separation jumps from step to step, exact for straight paths as refined is.
+    separations = np.full(len(velocities), float(target_separation))
+    rows = StrippedNBody.batch_simulation(velocities[:, 0].copy(), velocities[:, 1].copy(), velocities[:, 2].copy(),
+                                          separations, target_step() + 1, 0)
+    d = rows[:, 0:3] - rows[:, 6:9]
+    u = rows[:, 3:6] - rows[:, 9:12]
+    offset = -np.sum(d * u, axis=1) / np.sum(u * u, axis=1)  # Time from the target time to the closest approach.
+    closest = np.sqrt(np.sum((d + u * offset[:, np.newaxis]) ** 2, axis=1))
+
+    error = ((closest / StrippedNBody.kpc - target_pericentre) / pericentre_tolerance) ** 2 + \
+        ((offset / StrippedNBody.Gyr) / time_tolerance) ** 2
+    return np.where(np.isfinite(error), error, np.inf)  # Orbits that fail to integrate are never chosen.
+
+
+def check(velocities):  # Rows of StrippedNBody up to the end of the search window, for the velocities whose smallest
+    if len(velocities) == 0:  # separation in it is within the tolerances of the target.
+        return np.zeros((0, 19))
+    separations = np.full(len(velocities), float(target_separation))
+    rows = StrippedNBody.batch_simulation(velocities[:, 0].copy(), velocities[:, 1].copy(), velocities[:, 2].copy(),
+                                          separations, window_steps() + 1, stop_below())
+    good = (np.abs(rows[:, 12] - target_pericentre) <= pericentre_tolerance) & \
+        (np.abs(np.abs(rows[:, 13]) - target_time) <= time_tolerance)
+    return rows[good]
+
+
+def coarse_search():  # Best random starting velocities, within the velocities of the sweep grid.
+    grid = StrippedNBody.sweep_grid()
+    low = np.array([np.min(grid[i]) for i in range(3)])
+    high = np.array([np.max(grid[i]) for i in range(3)])
+
+    velocities = np.random.uniform(low, high, (coarse_samples, 3))
+    return velocities[np.argsort(evaluate(velocities))[:starts]]
+
+
+def nelder_mead(points):  # Runs a Nelder-Mead simplex from each point, all in step with each other, so each
+    k = len(points)  # step of every simplex is one or two batches of orbits. Returns the simplices, best first.
+    simplex = np.repeat(points[:, np.newaxis, :], 4, axis=1)
+    simplex[:, 1:, :] += initial_step * np.eye(3)
+    values = evaluate(simplex.reshape(-1, 3)).reshape(k, 4)
+    active = np.ones(k, dtype=bool)
+
+    for iteration in range(max_iterations):
+        order = np.argsort(values, axis=1)
+        simplex = np.take_along_axis(simplex, order[:, :, np.newaxis], axis=1)
+        values = np.take_along_axis(values, order, axis=1)
+
+        size = np.max(np.abs(simplex[:, 1:] - simplex[:, :1]), axis=(1, 2))
+        active &= (values[:, 0] > converged_error) & (size > smallest_step)
+        live = np.flatnonzero(active)
+        if len(live) == 0:
+            break
+
+        s, f = simplex[live], values[live]
+        centroid = np.mean(s[:, :3], axis=1)
+        worst = s[:, 3]
+        reflected = 2 * centroid - worst
+        f_reflected = evaluate(reflected)
+
+        expand = f_reflected < f[:, 0]
+        contract = f_reflected >= f[:, 2]
+        outside = contract & (f_reflected < f[:, 3])  # Contracts towards the reflected point, else towards the worst.
+        trial = np.where(expand[:, np.newaxis], centroid + 2 * (reflected - centroid),
+                         np.where(outside[:, np.newaxis], centroid + 0.5 * (reflected - centroid),
+                                  centroid + 0.5 * (worst - centroid)))
+        f_trial = np.full(len(live), np.inf)
+        f_trial[expand | contract] = evaluate(trial[expand | contract])
+
+        # The worst point is replaced by the expanded, reflected or contracted point, whichever is taken.
+        take_trial = (expand & (f_trial < f_reflected)) | (outside & (f_trial <= f_reflected)) | \
+            (contract & ~outside & (f_trial < f[:, 3]))
+        take_reflected = ~take_trial & ~contract
+        s[take_trial, 3], f[take_trial, 3] = trial[take_trial], f_trial[take_trial]
+        s[take_reflected, 3], f[take_reflected, 3] = reflected[take_reflected], f_reflected[take_reflected]
+
+        shrink = contract & ~take_trial  # Every point but the best moves half way towards it.
+        if np.any(shrink):
+            s[shrink, 1:] = s[shrink, :1] + 0.5 * (s[shrink, 1:] - s[shrink, :1])
+            f[shrink, 1:] = evaluate(s[shrink, 1:].reshape(-1, 3)).reshape(-1, 3)
+
+        simplex[live], values[live] = s, f
+
+    order = np.argsort(values, axis=1)
+    return np.take_along_axis(simplex, order[:, :, np.newaxis], axis=1)
+
+
+def search():  # Rows of every distinct solution found, one for each point of the family of velocities that give
+    points = coarse_search()  # the target pericentre at the target time.
+    print("Refining the best", len(points), "of", coarse_samples, "random velocities after",
+          round(time.time() - start_time), "s.\n")
+
+    best = nelder_mead(points)[:, 0]
+    best = np.unique(np.round(best, 1), axis=0)  # Simplices that met at the same velocities give one solution.
+    print("Checking", len(best), "refined velocities after", round(time.time() - start_time), "s.\n")
+
+    return check(best)
+
+
+def main():
+    global target_pericentre, target_time, target_separation
+    if len(sys.argv) == 4:  # The target can be given as: pericentre (kpc) time (Gyrs) separation (kpc).
+        target_pericentre, target_time, target_separation = [float(value) for value in sys.argv[1:]]
+
+    solutions = search()
+
+    file = open(solution_file, "w")
+    for row in solutions.tolist():
+        file.write(StrippedNBody.result_line(row))
+    file.close()
+
+    print(len(solutions), "solutions with a pericentre of", target_pericentre, "kpc at", target_time,
+          "Gyrs were written to", solution_file, "after", round(time.time() - start_time), "s.\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,9 @@ import os
 from mpl_toolkits.mplot3d import Axes3D
 from scipy.optimize import curve_fit
 from IntData import *
+from SweepStore import SweepStore, import_text, store_name
+from SweepIndex import SweepIndex
+from StrippedNBody import result_line
 
 # pericentre = []
 # time_of_pericentre = []
@@ -28,25 +31,18 @@ input_file_name = "Automation_Data7.txt"
 output_file_name = "Adequate_Data7.txt"
 
 
+def open_store(file_name):  # Store of a text file of results, with any lines added to the file since it was last read.
+    if not os.path.exists(file_name):
+        return SweepStore(store_name(file_name))
+    return import_text(file_name)
+
+
 def read_file(file_name, pericentre, time_of_pericentre):
-    file = open(file_name, "r")
-    line_no = 0
-    for line in file:
-        line_no += 1
-        if line[0] == '#':
-            continue
-        else:
-            data = line.strip().split("\t")
-            if float(data[12]) < 0.1 or -float(data[13]) > 1.4:
-                continue
-            else:
-                pericentre.append(float(data[12]))
-                time_of_pericentre.append(-float(data[13]))
-                separation.append(float(data[14]))
-                # ratio.append(float(data[18]))
-                # if 0.2 < -float(data[13]) < 0.3 and float(data[12]) < 50:
-                #     usable_lines.append(line_no)
-    file.close()
+    rows = open_store(file_name).query(pericentre=(0.1, None), time=(None, 1.4),
+                                       names=["pericentre", "time_of_pericentre", "separation"])
+    pericentre.extend(rows[:, 0].tolist())
+    time_of_pericentre.extend((-rows[:, 1]).tolist())
+    separation.extend(rows[:, 2].tolist())
 
 
 def plot_pericentre_info():
@@ -96,6 +92,32 @@ def plot_pericentre_info_cb():
     cb.ax.tick_params(labelsize=18)
 
 
+def plot_nearest_pericentres(file_name, k=1000):  # The k results of a file closest to the result used, by their
+    rows = SweepIndex(open_store(file_name)).nearest("output", [37.73, 0.2234], k)[1]  # pericentre and its time.
+    fig, ax = plt.subplots()
+    p = ax.scatter(rows[:, 12], -rows[:, 13], c=rows[:, 14], cmap='plasma', s=8)
+    ax.scatter(37.73, 0.2234, c='y', s=100, zorder=2.5)
+    ax.set_xlabel("Pericentre $(kpc)$", fontsize=25, weight='bold')
+    ax.set_ylabel("Lookback Time $(Gyrs)$", fontsize=25, weight='bold')
+    ax.tick_params(labelsize=22)
+    cb = fig.colorbar(p)
+    cb.set_label(label='Separation $(kpc)$', size=18)
+    cb.ax.tick_params(labelsize=18)
+
+
+def plot_nearest_velocities(file_name, k=1000):  # Initial velocities of the k results of a file closest to the result
+    distance, rows = SweepIndex(open_store(file_name)).nearest("output", [37.73, 0.2234], k)  # used.
+    fig = plt.figure()
+    ax = fig.add_subplot(projection='3d')
+    p = ax.scatter(rows[:, 15] / km_s, rows[:, 16] / km_s, rows[:, 17] / km_s, c=distance, cmap='plasma', s=8)
+    ax.set_xlabel("$v_x$ $(km/s)$", fontsize=18)
+    ax.set_ylabel("$v_y$ $(km/s)$", fontsize=18)
+    ax.set_zlabel("$v_z$ $(km/s)$", fontsize=18)
+    cb = fig.colorbar(p)
+    cb.set_label(label='Distance from Result Used $(kpc)$', size=18)
+    cb.ax.tick_params(labelsize=18)
+
+
 def round_up_time(value):
     value = 100 * value
     new_value = math.ceil(value)
@@ -104,17 +126,13 @@ def round_up_time(value):
 
 
 def find_min_pericentre_time():
-    input_file = open(input_file_name, "r")
+    rows = open_store(input_file_name).query(pericentre=(37.73, 37.734), time=(0.22338, 0.22342), in_order=True)
+    rows = rows[(rows[:, 12] > 37.73) & (rows[:, 12] < 37.734) & (-rows[:, 13] > 0.22338) & (-rows[:, 13] < 0.22342)]
     output_file = open(output_file_name, "w+")
-    for line in input_file:
-        if line[0] == '#':
-            continue
-        else:
-            data = line.strip().split("\t")
-            if (37.73 < float(data[12]) < 37.734) and (0.22338 < -float(data[13]) < 0.22342):
-                print(line)
-                output_file.write(line)
-    input_file.close()
+    for row in rows.tolist():
+        line = result_line(row[:-1] if math.isnan(row[-1]) else row)  # Older results have no max_end.
+        print(line)
+        output_file.write(line)
     output_file.close()
 
 
@@ -130,6 +148,8 @@ def main():  # Calling all functions in order.
     # find_min_pericentre_time()
 
     # plot_pericentre_info_cb()
+    # plot_nearest_pericentres(input_file_name)
+    # plot_nearest_velocities(input_file_name)
     plot_pericentre_info()
     # plot_separation_pericentre_info()
     # plot_separation_time_info()
@@ -5,6 +5,12 @@ import time
 import os
 import random
 import sys
+from scipy.special import erf
+
+batch = sys.argv[1:2] == ["--batch"]  # Option to run the whole sweep of AutomateSNBody.sh at once, see batch_main.
+batch = batch or __name__ != '__main__'  # Imported, e.g. by SweepRunner, there is no single run on the command line.
+batch_size = 4096  # Number of initial conditions integrated together in batch mode.
+batch_file = "Automation_Data.txt"  # File the batch results are added to, one line per initial condition.
 
 # Galaxy options:
 rewind = True
@@ -29,7 +35,7 @@ sm = 1.989e30  # Solar Mass.
 yr = 60 * 60 * 24 * 365  # Year in seconds.
 Gyr = 1e9 * yr  # Giga-year in seconds.
 critical_density = 136 * sm / (kpc ** 3)  # Critical density of the universe.
-separation = float(sys.argv[4])  # Desired separation of the two galaxies.
+separation = 0 if batch else float(sys.argv[4])  # Desired separation of the two galaxies.
 separation_ratio = separation / 601.23
 
 # Simulation time conditions:
@@ -40,6 +46,13 @@ if rewind:
     time_run = - time_run  # Total time simulation is run for, backwards.
 no_step = time_run / time_step  # Total number of steps in simulation.
 
+# Acceptance window of OISAnalysis, pericentres of more than 0.1 kpc less than 1.4 Gyr back. An orbit fails it for
+# good once it comes closer than 0.1 kpc, or once its smallest separation so far is more than 1.4 Gyr back, as any
+# closer one would be further back still.
+early_stop = True  # Option to stop an orbit as soon as it fails the acceptance window, as OISAnalysis drops it.
+min_pericentre = 0.1 * kpc  # Smallest pericentre OISAnalysis accepts.
+max_pericentre_time = 1.4 * Gyr  # Longest time back to a pericentre OISAnalysis accepts.
+
 # Identifiers for each galaxy, used in the code to specify each.
 primary = 1
 secondary = 2
@@ -47,12 +60,13 @@ secondary = 2
 # Primary galaxy starting conditions:
 pri_galaxy_name = "NGC5257"  # Name of the primary galaxy.
 mg1 = 0.358e11 * sm  # Mass of primary galaxy.
-xg1 = -211.92 * kpc * separation_ratio  # x position of primary galaxy.
-yg1 = 547.54 * kpc * separation_ratio  # y position of primary galaxy.
-zg1 = 129.46 * kpc * separation_ratio  # y position of primary galaxy.
-vxg1 = float(sys.argv[1])  # x velocity of primary galaxy.
-vyg1 = float(sys.argv[2])  # y velocity of primary galaxy.
-vzg1 = float(sys.argv[3])  # z velocity of primary galaxy.
+pri_offset = [-211.92 * kpc, 547.54 * kpc, 129.46 * kpc]  # Position of primary galaxy for a separation ratio of 1.
+xg1 = pri_offset[0] * separation_ratio  # x position of primary galaxy.
+yg1 = pri_offset[1] * separation_ratio  # y position of primary galaxy.
+zg1 = pri_offset[2] * separation_ratio  # y position of primary galaxy.
+vxg1 = 0 if batch else float(sys.argv[1])  # x velocity of primary galaxy.
+vyg1 = 0 if batch else float(sys.argv[2])  # y velocity of primary galaxy.
+vzg1 = 0 if batch else float(sys.argv[3])  # z velocity of primary galaxy.
 pri_galaxy_marker = "bo"  # Colour and size of marker for primary galaxy being plotted.
 
 # Primary galaxy dark matter halo conditions:
@@ -94,8 +108,6 @@ class Body:
         self.xyz = position  # Array of x, y and z position of body.
         self.v_xyz = velocity  # Array of x, y and z velocities of body.
         self.a_xyz = [0, 0, 0]  # Array of x, y and z acceleration of body.
-        self.saved_xyz = [[], [], []]  # Array of all x, y and z position values of body.
-        self.saved_v_xyz = [[], [], []]  # Array of all x, y and z velocity values of body.
         self.colour = colour  # Colour of body on images.
 
     def name(self):
@@ -113,12 +125,6 @@ class Body:
     def a_xyz(self):
         return self.a_xyz
 
-    def saved_xyz(self):
-        return self.saved_xyz
-
-    def saved_v_xyz(self):
-        return self.saved_v_xyz
-
     def colour(self):
         return self.colour
 
@@ -299,12 +305,6 @@ def find_all_accelerations(bodies):
 
 
 def initial_leapfrog_step(bodies):
-    for body in bodies:
-        for i in range(len(body.saved_xyz)):
-            body.saved_xyz[i].append(body.xyz[i])
-            if body.name == pri_galaxy_name or body.name == sec_galaxy_name:
-                body.saved_v_xyz[i].append(body.v_xyz[i])
-
     find_all_accelerations(bodies)
 
 
@@ -313,68 +313,97 @@ def leapfrog_step(bodies):
         for i in range(len(body.a_xyz)):
             body.v_xyz[i] += body.a_xyz[i] * (time_step / 2)
             body.xyz[i] += body.v_xyz[i] * time_step
-            body.saved_xyz[i].append(body.xyz[i])
 
     find_all_accelerations(bodies)
 
     for body in bodies:
         for i in range(len(body.a_xyz)):
             body.v_xyz[i] += body.a_xyz[i] * (time_step / 2)
-            if body.name == pri_galaxy_name or body.name == sec_galaxy_name:
-                body.saved_v_xyz[i].append(body.v_xyz[i])
 
 
-def leapfrog_loop(bodies):
+def leapfrog_loop(bodies):  # Returns the pericentre tracker of the orbit.
     step = 0
 
     initial_leapfrog_step(bodies)
+    tracker = PericentreTracker(np.array([find_galaxy_separation()]))
 
     while True:
         step += 1
 
         if step == no_step:
-            return
+            return tracker
 
         else:
             leapfrog_step(bodies)
+            tracker.update(np.array([find_galaxy_separation()]), step)
+            if early_stop and (tracker.stopped(min_pericentre)[0] or
+                               tracker.late(max_pericentre_time / abs(time_step))[0]):
+                return tracker
 
 
 #######################################################################################################################
 
 
-def find_separations(separations):
-    xyz_pc = [None] * 3
+class PericentreTracker:  # Smallest and largest separations of many orbits, followed step by step, without their paths.
+    def __init__(self, r):
+        n = len(r)
+        self.pericentre = r.copy()  # Smallest separation so far.
+        self.pericentre_step = np.zeros(n, dtype=np.int64)  # Step of the smallest separation.
+        self.before = np.full(n, np.nan)  # Separations the step before and after the smallest, to refine it with.
+        self.after = np.full(n, np.nan)
+        self.apocentre = r.copy()  # Largest separation so far.
+        self.last = r.copy()  # Latest separation.
 
-    pri = find_galaxy(pri_galaxy_name)
-    sec = find_galaxy(sec_galaxy_name)
+    def update(self, r, step, rows=None):  # Separations r at a step, of every orbit or of the orbits in rows.
+        if rows is None:
+            rows = np.arange(len(self.last))
+
+        waiting = np.isnan(self.after[rows])  # The smallest separation was found at the step before.
+        self.after[rows[waiting]] = r[waiting]
+
+        closer = r < self.pericentre[rows]  # Strictly closer, so the first of equal separations is kept.
+        found = rows[closer]
+        self.before[found] = self.last[found]
+        self.after[found] = np.nan
+        self.pericentre[found] = r[closer]
+        self.pericentre_step[found] = step
 
-    for i in range(len(objects[pri].saved_xyz[0])):
-        for j in range(len(xyz_pc)):
-            xyz_pc[j] = (objects[pri].saved_xyz[j][i] - objects[sec].saved_xyz[j][i]) ** 2
-        separations.append(math.sqrt(xyz_pc[0] + xyz_pc[1] + xyz_pc[2]))
+        self.apocentre[rows] = np.maximum(self.apocentre[rows], r)
+        self.last[rows] = r
 
+    def stopped(self, limit):  # Orbits that have come closer than limit, so their pericentre is below it already.
+        return self.pericentre < limit
 
-def calculate_separation_info():
-    separations = []
+    def late(self, latest_step):  # Orbits whose smallest separation so far came after latest_step, even once refined
+        return self.pericentre_step - 0.5 > latest_step  # by up to half a step, as would any closer one still to come.
 
-    find_separations(separations)
+    def refined(self):  # Pericentre and its step, found between steps from a parabola through the squared separations
+        b, p, a = self.before ** 2, self.pericentre ** 2, self.after ** 2  # either side, exact for straight paths.
+        curve = b - 2 * p + a
+        inside = np.isfinite(curve) & (curve > 0)  # Not the first or last step, where there is nothing either side.
+        offset = np.where(inside, 0.5 * (b - a) / np.where(inside, curve, 1), 0)
+        lowest = np.where(inside, p - 0.25 * (b - a) * offset, p)
+        return np.sqrt(np.maximum(lowest, 0)), self.pericentre_step + offset
 
-    pericentre = min(separations)
-    apocentre = max(separations)
-    end_sep = separations[-1]
-    max_end = end_sep/apocentre
-    pericentre = pericentre / kpc
 
-    time_of_pericentre = ((separations.index(min(separations)) + 1) * time_step) / Gyr
+def find_galaxy_separation():
+    pri = find_galaxy(pri_galaxy_name)
+    sec = find_galaxy(sec_galaxy_name)
+    return objects[pri].find_separation(objects[sec])[1]
+
 
-    return pericentre, time_of_pericentre, max_end
+def calculate_separation_info(tracker):
+    pericentre, pericentre_step = tracker.refined()
+    max_end = tracker.last[0] / tracker.apocentre[0]
 
+    return pericentre[0] / kpc, (pericentre_step[0] * time_step) / Gyr, max_end
 
-def return_info():
+
+def return_info(tracker):
     pri = find_galaxy(pri_galaxy_name)
     sec = find_galaxy(sec_galaxy_name)
 
-    pericentre, time_of_pericentre, max_end = calculate_separation_info()
+    pericentre, time_of_pericentre, max_end = calculate_separation_info(tracker)
 
     print("{0}\t{1}\t{2}\t{3}\t{4}\t{5}\t{6}\t{7}\t{8}\t{9}\t{10}\t{11}\t{12}\t{13}\t{14}\t{15}\t{16}\t{17}\t{18}".format(
           objects[pri].xyz[0], objects[pri].xyz[1], objects[pri].xyz[2], objects[pri].v_xyz[0], objects[pri].v_xyz[1],
@@ -389,16 +418,167 @@ def return_info():
 def generate_simulation():
     create_galaxies()
 
-    leapfrog_loop(objects)
+    tracker = leapfrog_loop(objects)
+
+    return_info(tracker)
+
+
+#######################################################################################################################
+
+
+def sweep_grid():  # Velocities and separations of every run of AutomateSNBody.sh, in the order it makes them.
+    v, max_v, max_steps = 10000, 60000, 12
+    sep, max_sep, lim = 50, 30, 6
+    del_v = max_v // max_steps
+    del_sep = max_sep // lim
 
-    return_info()
+    i, j, k, l = np.meshgrid(np.arange(-max_steps, max_steps + 1), np.arange(-max_steps, max_steps + 1),
+                             np.arange(-max_steps, max_steps + 1), np.arange(-lim, lim + 1), indexing='ij')
+    return (3 * v + i.ravel() * del_v).astype(float), (-6 * v + j.ravel() * del_v).astype(float), \
+        (-2 * v + k.ravel() * del_v).astype(float), (sep + l.ravel() * del_sep).astype(float)
+
+
+def batch_separation(pos1, pos2):  # Separations of each pair of galaxies, summed in the same order as find_separation.
+    d = pos1 - pos2
+    return np.sqrt(d[:, 0] ** 2 + d[:, 1] ** 2 + d[:, 2] ** 2)
+
+
+def batch_dmh_acceleration(r_xyz, r, galaxy_id):  # Acceleration towards a galaxy's halo, at separations r_xyz.
+    if galaxy_id == primary:
+        a = ((G * M_vir1) / (math.log(1 + c1) - (c1 / (1 + c1)))) * \
+            (((r / (r + R_s1)) - (np.log(1 + r / R_s1))) / (r ** 2))
+    else:
+        a = ((G * M_vir2) / (math.log(1 + c2) - (c2 / (1 + c2)))) * \
+            (((r / (r + R_s2)) - (np.log(1 + r / R_s2))) / (r ** 2))
+    return a[:, np.newaxis] * (r_xyz / r[:, np.newaxis])
+
+
+def batch_dynamical_friction(m, r, v_xyz, causing_galaxy_id):  # Friction on galaxies of mass m, moving at v_xyz
+    v = np.sqrt(v_xyz[:, 0] ** 2 + v_xyz[:, 1] ** 2 + v_xyz[:, 2] ** 2)  # relative to the other galaxy.
+
+    epsilon = 28.5 * kpc
+    ln_lambda = np.log(r / (1.4 * epsilon))
+
+    if causing_galaxy_id == primary:
+        density_distribution = rho_zero1 / ((r / R_s1) * (1 + (r / R_s1)) ** 2)
+        v_dispersion = V_max1 * ((1.4393 * (r / R_s1) ** 0.354) / (1 + 1.1756 * (r / R_s1) ** 0.725))
+    else:
+        density_distribution = rho_zero2 / ((r / R_s2) * (1 + (r / R_s2)) ** 2)
+        v_dispersion = V_max2 * ((1.4393 * (r / R_s2) ** 0.354) / (1 + 1.1756 * (r / R_s2) ** 0.725))
+
+    X = v / ((2 ** 0.5) * v_dispersion)
+
+    a = - ((4 * math.pi * (G ** 2) * m * ln_lambda * density_distribution) / (v ** 2)) * (
+            erf(X) - (2 * X / (math.pi ** 0.5)) * np.exp(-(X ** 2)))
+    return a[:, np.newaxis] * (v_xyz / v[:, np.newaxis])
+
+
+def batch_accelerations(pos1, vel1, pos2, vel2):  # Same forces as find_all_accelerations, on every pair at once.
+    a1 = np.zeros_like(pos1)
+    a2 = np.zeros_like(pos2)
+    r_xyz = pos1 - pos2  # From the secondary to the primary galaxy.
+    r = batch_separation(pos1, pos2)
+
+    if newtonian_gravity:
+        a1 += (- (G * mg2) / (r ** 2))[:, np.newaxis] * (r_xyz / r[:, np.newaxis])
+        a2 += (- (G * mg1) / (r ** 2))[:, np.newaxis] * (- r_xyz / r[:, np.newaxis])
+
+    if primary_dmh_potential:
+        a2 += batch_dmh_acceleration(- r_xyz, r, primary)
+    if secondary_dmh_potential:
+        a1 += batch_dmh_acceleration(r_xyz, r, secondary)
+
+    if primary_dynamical_friction:
+        a2 += batch_dynamical_friction(mg2, r, vel2 - vel1, primary)
+    if secondary_dynamical_friction:
+        a1 += batch_dynamical_friction(mg1, r, vel1 - vel2, secondary)
+
+    return a1, a2
+
+
+def batch_simulation(vx, vy, vz, separations, steps=None, stop_below=None, stop_after=None):  # Integrates one galaxy
+    # pair per initial condition, all together, and returns the rows return_info prints for each. Steps, stop_below, a
+    # separation in metres, and stop_after, a time in seconds, are used in place of no_step and the early_stop of
+    # min_pericentre and max_pericentre_time.
+    n = len(vx)
+    if steps is None:
+        steps = int(no_step)
+    if stop_below is None and early_stop:
+        stop_below = min_pericentre
+    if stop_after is None and early_stop:
+        stop_after = max_pericentre_time
+    latest_step = np.inf if stop_after is None else stop_after / abs(time_step)  # No orbit is late before it.
+
+    ratio = separations / 601.23
+    pos1 = np.array(pri_offset)[np.newaxis, :] * ratio[:, np.newaxis]
+    vel1 = np.stack([vx, vy, vz], axis=1)
+    pos2 = np.tile([xg2, yg2, zg2], (n, 1)).astype(float)
+    vel2 = np.tile([vxg2, vyg2, vzg2], (n, 1)).astype(float)
+
+    tracker = PericentreTracker(batch_separation(pos1, pos2))
+    rows = np.arange(n)  # Orbits still being integrated, in the order of the arrays below.
+    state = np.zeros((n, 12))  # Positions and velocities of both galaxies at the end of each orbit.
+
+    a1, a2 = batch_accelerations(pos1, vel1, pos2, vel2)
+    for step in range(1, steps):
+        vel1 += a1 * (time_step / 2)
+        vel2 += a2 * (time_step / 2)
+        pos1 += vel1 * time_step
+        pos2 += vel2 * time_step
+
+        a1, a2 = batch_accelerations(pos1, vel1, pos2, vel2)
+        vel1 += a1 * (time_step / 2)
+        vel2 += a2 * (time_step / 2)
+
+        tracker.update(batch_separation(pos1, pos2), step, rows)
+        late = step - 0.5 > latest_step
+        if stop_below is not None or late:
+            stop = np.zeros(len(rows), dtype=bool)
+            if stop_below is not None:
+                stop |= tracker.stopped(stop_below)[rows]
+            if late:
+                stop |= tracker.late(latest_step)[rows]
+            if np.any(stop):  # Finished orbits are taken out of the arrays, so the rest step faster.
+                state[rows[stop]] = np.hstack([pos1[stop], vel1[stop], pos2[stop], vel2[stop]])
+                keep = ~stop
+                rows, pos1, vel1, pos2, vel2, a1, a2 = rows[keep], pos1[keep], vel1[keep], pos2[keep], vel2[keep], \
+                    a1[keep], a2[keep]
+                if len(rows) == 0:
+                    break
+    state[rows] = np.hstack([pos1, vel1, pos2, vel2])
+
+    pericentre, pericentre_step = tracker.refined()
+    time_of_pericentre = (pericentre_step * time_step) / Gyr
+    return np.column_stack([state, pericentre / kpc, time_of_pericentre, separations, vx, vy, vz,
+                            tracker.last / tracker.apocentre])
+
+
+def result_line(row):  # One line of the results file, with the columns and number format of return_info.
+    return "\t".join(str(value) for value in row) + "\n"
+
+
+def batch_main():  # Runs the sweep of AutomateSNBody.sh in this one process, adding the same lines to batch_file.
+    vx, vy, vz, separations = sweep_grid()
+    print("Integrating", len(vx), "initial conditions in batches of", batch_size, ".\n")
+
+    file = open(batch_file, "a")
+    for start in range(0, len(vx), batch_size):
+        rows = slice(start, start + batch_size)
+        for row in batch_simulation(vx[rows], vy[rows], vz[rows], separations[rows]).tolist():
+            file.write(result_line(row))
+        file.flush()
+        print(min(start + batch_size, len(vx)), "of", len(vx), "done after", round(time.time() - start_time), "s.")
+    file.close()
 
 
 #######################################################################################################################
 
 
 def main():
-    generate_simulation()
+    if batch:
+        batch_main()
+    else:
+        generate_simulation()
 
 
 if __name__ == '__main__':
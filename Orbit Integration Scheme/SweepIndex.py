@@ -0,0 +1,56 @@
+import os
+import pickle
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Spaces the sweep results are indexed in, the columns of SweepStore making them up, and the size of one unit of
+# distance along each. Inputs are measured in steps of the AutomateSNBody.sh grid, 5000 m/s and 5 kpc. Outputs are
+# measured in kpc, with 0.01 Gyrs of lookback time counting as 1 kpc, as the tolerances of InitialConditionSearch.
+spaces = {"input": (["initial_pri_vx", "initial_pri_vy", "initial_pri_vz", "separation"], [5000, 5000, 5000, 5]),
+          "output": (["pericentre", "time_of_pericentre"], [1, -0.01])}  # Negative, to give lookback times.
+index_file = "Sweep_Index.pkl"  # File in the store's directory the trees are kept in.
+
+
+class SweepIndex:  # KD-trees over the results of a SweepStore, in the input and output spaces, kept in the store's
+    # directory and made again once the store's chunks have changed since, by an append or compact. Chunk names are
+    # never used twice, so the same names are the same rows in the same order.
+    def __init__(self, store):
+        self.store = store
+        self.file_name = os.path.join(store.directory, index_file)
+        self.trees = None
+        if os.path.exists(self.file_name):
+            file = open(self.file_name, "rb")
+            saved = pickle.load(file)
+            file.close()
+            if saved["chunks"] == store.chunk_files:
+                self.trees = saved["trees"]
+        if self.trees is None:
+            self.build()
+
+    def build(self):  # Makes both trees from every row of the store, then saves them.
+        self.trees = {}
+        for space, (names, scales) in spaces.items():
+            self.trees[space] = cKDTree(self.store.query(names=names) / np.array(scales, dtype=float))
+
+        temporary = self.file_name + ".part"  # The file is only ever replaced by a complete index.
+        file = open(temporary, "wb")
+        pickle.dump({"chunks": self.store.chunk_files, "trees": self.trees}, file, protocol=pickle.HIGHEST_PROTOCOL)
+        file.flush()
+        os.fsync(file.fileno())
+        file.close()
+        os.replace(temporary, self.file_name)
+
+    def nearest(self, space, point, k=1):  # Distances to and rows of the k results nearest a point of a space, e.g.
+        names, scales = spaces[space]  # (pericentre, lookback time) of the output space, closest first.
+        distance, numbers = self.trees[space].query(np.array(point, dtype=float) / np.abs(scales), k=k)
+        distance, numbers = np.atleast_1d(distance), np.atleast_1d(numbers)
+        found = numbers < self.trees[space].n  # Fewer results than k leaves the rest missing.
+        return distance[found], self.store.rows(numbers[found])
+
+    def within(self, space, point, radius):  # Distances to and rows of every result within a radius of a point of
+        names, scales = spaces[space]  # a space, closest first.
+        scaled = np.array(point, dtype=float) / np.abs(scales)
+        numbers = np.array(self.trees[space].query_ball_point(scaled, radius), dtype=int)
+        distance = np.sqrt(np.sum((self.trees[space].data[numbers] - scaled) ** 2, axis=1))
+        order = np.argsort(distance, kind='stable')
+        return distance[order], self.store.rows(numbers[order])
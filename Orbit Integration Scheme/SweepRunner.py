@@ -0,0 +1,126 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+import StrippedNBody
+
+workers = os.cpu_count()  # Number of processes integrating chunks of the sweep at once.
+chunk_size = 1024  # Number of grid points each process integrates together, as one batch.
+results_file = "Automation_Data.txt"  # File the results are added to, one line per grid point, as AutomateSNBody.sh.
+ledger_file = "Sweep_Ledger.txt"  # Grid points already in the results file, so a restarted sweep skips them.
+
+start_time = time.time()  # Sets start time in order to find runtime of program.
+
+
+def point_key(vx, vy, vz, separation):  # Text naming one grid point, the same however the grid was made.
+    return "%r %r %r %r" % (float(vx), float(vy), float(vz), float(separation))
+
+
+def read_ledger():  # Grid points done, the length of the results file when the last of them was written, and the
+    done = set()  # length of the ledger up to the end of the last chunk it has all of.
+    end = None
+    committed = 0
+    if not os.path.exists(ledger_file):
+        return done, end, committed
+
+    file = open(ledger_file, "rb")
+    points = []  # Grid points of the chunk being read, only done once the line ending their chunk follows them.
+    for line in file:
+        if not line.endswith(b"\n"):  # Cut short by a stopped sweep.
+            break
+        data = line.decode().split()
+        if len(data) == 2 and data[0] == "results" and end is None:
+            end = int(data[1])
+            committed = file.tell()
+        elif len(data) == 4 and data[0] != "chunk":
+            points.append(" ".join(data))
+        elif len(data) == 4 and int(data[1]) == len(points) and int(data[2]) == end:
+            done.update(points)
+            end = int(data[3])
+            committed = file.tell()
+            points = []
+        else:
+            file.close()
+            raise ValueError("%s has a line it should not: %s" % (ledger_file, line.decode().strip()))
+    file.close()
+    return done, end, committed
+
+
+def open_results(end):  # Opens the results file to add to, first cutting off any lines written after the ledger's
+    file = open(results_file, "ab")  # last complete chunk, as those grid points are run again.
+    if end is not None:
+        if file.tell() < end:
+            file.close()
+            raise ValueError("%s is shorter than %s says it should be." % (results_file, ledger_file))
+        file.truncate(end)
+        file.seek(end)  # Truncating leaves the position at the old end, which tell would still give.
+    return file
+
+
+def open_ledger(committed, results):  # Opens the ledger to add to, first cutting off any points of a chunk that was
+    ledger = open(ledger_file, "ab")  # not finished, as they are run again. A new ledger starts with the length of
+    ledger.truncate(committed)  # the results file, which may already hold lines from AutomateSNBody.sh.
+    if committed == 0:
+        ledger.write(("results %d\n" % results.tell()).encode())
+        ledger.flush()
+        os.fsync(ledger.fileno())
+    return ledger
+
+
+def run_chunk(points):  # Integrates a chunk of grid points, in a worker process.
+    rows = StrippedNBody.batch_simulation(points[:, 0].copy(), points[:, 1].copy(), points[:, 2].copy(),
+                                          points[:, 3].copy())
+    return points, [StrippedNBody.result_line(row) for row in rows.tolist()]
+
+
+def write_chunk(results, ledger, points, lines):  # Only the main process writes, so lines never interleave. The
+    start = results.tell()  # results are on disk before the ledger says they are done, and the points of a chunk
+    results.write("".join(lines).encode())  # only count as done once the line ending the chunk is written after them,
+    results.flush()  # with the lengths of the results file before and after it.
+    os.fsync(results.fileno())
+
+    record = "".join("%s\n" % point_key(*point) for point in points)
+    ledger.write((record + "chunk %d %d %d\n" % (len(points), start, results.tell())).encode())
+    ledger.flush()
+    os.fsync(ledger.fileno())
+
+
+def pending_points():  # Grid points of the sweep not yet in the ledger, each only once.
+    done, end, committed = read_ledger()
+    points = []
+    for point in zip(*StrippedNBody.sweep_grid()):
+        key = point_key(*point)
+        if key not in done:
+            done.add(key)
+            points.append(point)
+    return np.array(points).reshape(-1, 4), end, committed
+
+
+def run_sweep():
+    points, end, committed = pending_points()
+    print("Running", len(points), "grid points in chunks of", chunk_size, "on", workers, "processes.\n")
+
+    results = open_results(end)
+    ledger = open_ledger(committed, results)
+    chunks = [points[start:start + chunk_size] for start in range(0, len(points), chunk_size)]
+    completed = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        running = set()
+        while len(chunks) > 0 or len(running) > 0:
+            while len(chunks) > 0 and len(running) < 2 * workers:  # Only a few chunks wait, so results do not pile up.
+                running.add(pool.submit(run_chunk, chunks.pop(0)))
+
+            finished, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                chunk, lines = future.result()
+                write_chunk(results, ledger, chunk, lines)
+                completed += len(chunk)
+                print(completed, "of", len(points), "done after", round(time.time() - start_time), "s.")
+
+    ledger.close()
+    results.close()
+
+
+if __name__ == '__main__':
+    run_sweep()
@@ -0,0 +1,214 @@
+import os
+import sys
+import json
+import time
+import itertools
+import numpy as np
+
+# Columns of a row of results, in the order StrippedNBody.return_info prints them. Times of pericentre are as printed,
+# negative when rewinding, while queries take the lookback time, as OISAnalysis plots it.
+columns = ["pri_x", "pri_y", "pri_z", "pri_vx", "pri_vy", "pri_vz", "sec_x", "sec_y", "sec_z", "sec_vx", "sec_vy",
+           "sec_vz", "pericentre", "time_of_pericentre", "separation", "initial_pri_vx", "initial_pri_vy",
+           "initial_pri_vz", "max_end"]
+import_rows = 1000000  # Number of lines of a text file read and stored together by import_text.
+manifest_file = "manifest.json"  # File in a store's directory naming its chunks, in order, and how many bytes of its
+# text file have been imported into it.
+
+start_time = time.time()  # Sets start time in order to find runtime of program.
+
+
+class SweepStore:  # Append only store of sweep results in a directory, one .npy file per chunk of rows. Each chunk is
+    # a (columns, rows) array, so every column of it is read on its own, and its rows are sorted by pericentre, so a
+    # range of pericentres is found by a binary search instead of reading every row. A last row of each chunk numbers
+    # its rows in the order they were added, as in the text file, so that order can be given back. The chunks of the
+    # store are those named in its manifest, which is only ever replaced whole, so a stopped append or compact leaves
+    # the store as it was before or after, never in between. Files it leaves behind are removed when the store is next
+    # opened.
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.chunk_files = []
+        self.imported = 0  # Bytes of the text file the store was imported from already in it.
+        if os.path.exists(self.path(manifest_file)):
+            file = open(self.path(manifest_file), "r")
+            manifest = json.load(file)
+            file.close()
+            self.chunk_files, self.imported = manifest["chunks"], manifest["imported"]
+        else:  # Made before stores had a manifest, when every chunk file was a chunk of the store, and how much of
+            chunk_files = sorted(name for name in os.listdir(directory) if name.startswith("chunk_") and
+                                 name.endswith(".npy"))  # the text file was imported was not kept.
+            self.write_manifest(chunk_files, 0 if len(chunk_files) == 0 else None)
+        for name in os.listdir(directory):
+            if (name.startswith("chunk_") and name not in self.chunk_files) or name.endswith(".part"):
+                os.remove(self.path(name))
+
+    def __len__(self):
+        return sum(chunk.shape[1] for chunk in self.chunks())
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def chunks(self):  # Every chunk, mapped from its file rather than read, so only the parts queried are loaded.
+        return [np.load(self.path(name), mmap_mode='r') for name in self.chunk_files]
+
+    def write_file(self, name, write):  # Writes a file of the store through a temporary file, so a file of the name
+        temporary = self.path(name + ".part")  # is always complete.
+        file = open(temporary, "wb")
+        write(file)
+        file.flush()
+        os.fsync(file.fileno())
+        file.close()
+        os.replace(temporary, self.path(name))
+
+    def write_chunk(self, chunk):  # Writes a chunk under a name no chunk of the store has had, returning the name.
+        numbers = [int(name[6:12]) for name in os.listdir(self.directory) if name.startswith("chunk_")]
+        name = "chunk_%06d.npy" % (max(numbers + [len(self.chunk_files) - 1]) + 1)
+        self.write_file(name, lambda file: np.save(file, chunk))
+        return name
+
+    def write_manifest(self, chunk_files, imported):  # Makes the named chunks the store, in one step.
+        manifest = json.dumps({"chunks": chunk_files, "imported": imported})
+        self.write_file(manifest_file, lambda file: file.write(manifest.encode()))
+        self.chunk_files, self.imported = chunk_files, imported
+
+    def append(self, rows, imported=None):  # Adds rows of results, each a row of Automation_Data.txt, as one new
+        rows = np.asarray(rows, dtype=float).reshape(-1, len(columns))  # chunk, along with the bytes of the text file
+        chunk_files = self.chunk_files  # imported once they are in, if they come from one.
+        if len(rows) > 0:
+            rows = np.hstack([rows, len(self) + np.arange(len(rows))[:, np.newaxis]])
+            chunk = np.ascontiguousarray(rows[np.argsort(rows[:, 12], kind='stable')].T)
+            chunk_files = chunk_files + [self.write_chunk(chunk)]
+        if chunk_files != self.chunk_files or imported is not None:
+            self.write_manifest(chunk_files, self.imported if imported is None else imported)
+
+    def query(self, pericentre=None, time=None, separation=None, names=None, in_order=False):  # Rows with the
+        # pericentre, lookback time of pericentre and separation in the given (low, high) ranges, including the ends.
+        # A range, or either end of one, of None is not checked. Only the named columns are returned, all of them by
+        # default, sorted by pericentre within each chunk, or in the order the rows were added if in_order.
+        wanted = [columns.index(name) for name in (columns if names is None else names)]
+        low, high = bounds(pericentre)
+
+        found = []
+        numbers = []
+        first = 0  # Rows in the chunks before this one.
+        for chunk in self.chunks():
+            first += chunk.shape[1]
+            start = np.searchsorted(chunk[12], low, side='left')
+            end = np.searchsorted(chunk[12], high, side='right')
+            if start >= end:
+                continue
+            keep = np.ones(end - start, dtype=bool)
+            if time is not None:
+                keep &= within(-chunk[13, start:end], time)
+            if separation is not None:
+                keep &= within(chunk[14, start:end], separation)
+            found.append(np.stack([chunk[i, start:end][keep] for i in wanted], axis=1))  # Only the rows kept are read.
+            if in_order:
+                numbers.append(chunk_order(chunk, first - chunk.shape[1])[start:end][keep])
+
+        if len(found) == 0:
+            return np.zeros((0, len(wanted)))
+        if in_order:
+            return np.concatenate(found)[np.argsort(np.concatenate(numbers), kind='stable')]
+        return np.concatenate(found)
+
+    def rows(self, numbers, names=None):  # Rows by their number, counting through the chunks in order, as a query
+        wanted = [columns.index(name) for name in (columns if names is None else names)]  # with no ranges gives them.
+        numbers = np.asarray(numbers, dtype=int)
+        found = np.zeros((len(numbers), len(wanted)))
+        start = 0
+        for chunk in self.chunks():
+            inside = (numbers >= start) & (numbers < start + chunk.shape[1])
+            if np.any(inside):
+                found[inside] = chunk[np.ix_(wanted, numbers[inside] - start)].T
+            start += chunk.shape[1]
+        return found
+
+    def compact(self, chunk_rows=import_rows):  # Rewrites the store as chunks of at least chunk_rows, after many
+        old = self.chunk_files  # small appends, so a query searches fewer of them. The new chunks are written first,
+        new = []  # then the manifest is changed to them, and only then are the old ones removed.
+        waiting = []
+        first = 0
+        for i, chunk in enumerate(self.chunks()):
+            waiting.append(np.vstack([chunk[:len(columns)], chunk_order(chunk, first)]))
+            first += chunk.shape[1]
+            if sum(rows.shape[1] for rows in waiting) >= chunk_rows or i == len(old) - 1:
+                merged = np.concatenate(waiting, axis=1)
+                new.append(self.write_chunk(np.ascontiguousarray(merged[:, np.argsort(merged[12], kind='stable')])))
+                waiting = []
+
+        self.write_manifest(new, self.imported)
+        for name in old:
+            os.remove(self.path(name))
+
+
+def chunk_order(chunk, first):  # Numbers of the rows of a chunk in the order they were added. Chunks from before
+    if chunk.shape[0] > len(columns):  # these were kept are taken to be in the order of the chunks.
+        return np.asarray(chunk[len(columns)])
+    return first + np.arange(chunk.shape[1], dtype=float)
+
+
+def bounds(limits):  # Low and high ends of a range, open ends made infinite.
+    if limits is None:
+        return -np.inf, np.inf
+    return -np.inf if limits[0] is None else limits[0], np.inf if limits[1] is None else limits[1]
+
+
+def within(values, limits):  # Mask of the values inside a range, including its ends.
+    low, high = bounds(limits)
+    return (values >= low) & (values <= high)
+
+
+def store_name(file_name):  # Directory of the store imported from a text file of results.
+    return os.path.splitext(file_name)[0] + "_Store"
+
+
+def import_text(file_name, directory=None):  # Adds the rows of a text file of results, as written by AutomateSNBody.sh
+    # or SweepRunner, to a store. Only the lines added since the last import are read, and a last line still being
+    # written is left for the next one.
+    store = SweepStore(store_name(file_name) if directory is None else directory)
+    if store.imported is None:
+        raise ValueError("%s does not say how much of %s it holds. Delete it to import the file again." %
+                         (store.directory, file_name))
+    if os.path.getsize(file_name) < store.imported:
+        raise ValueError("%s is shorter than when it was imported into %s." % (file_name, store.directory))
+
+    file = open(file_name, "rb")
+    file.seek(store.imported)
+    imported = store.imported
+    while True:
+        lines = list(itertools.islice(file, import_rows))
+        if len(lines) > 0 and not lines[-1].endswith(b"\n"):
+            lines.pop()
+        if len(lines) == 0:
+            break
+        imported += sum(len(line) for line in lines)
+
+        # Older results, from before max_end was printed, have one column fewer, and may be followed by newer ones.
+        lines = [line.decode() for line in lines if not line.startswith(b"#")]
+        widths = np.array([line.count("\t") + 1 for line in lines])
+        rows = np.full((len(lines), len(columns)), np.nan)
+        for width in set(widths.tolist()):
+            if width not in (len(columns) - 1, len(columns)):
+                raise ValueError("%s has a line of %d columns." % (file_name, width))
+            rows[widths == width, :width] = np.loadtxt([line for line, w in zip(lines, widths) if w == width],
+                                                       delimiter="\t", ndmin=2)
+        store.append(rows, imported)
+    file.close()
+    return store
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("\nError. Give a text file of results to import, and optionally the store directory.\n")
+        exit(1)
+
+    store = import_text(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    print(len(store), "rows of", sys.argv[1], "are in", store.directory, "after", round(time.time() - start_time),
+          "s.\n")
+
+
+if __name__ == '__main__':
+    main()
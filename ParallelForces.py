@@ -0,0 +1,125 @@
+import numpy as np
+from multiprocessing import Pool, shared_memory
+from DirectGravity import direct_acceleration, direct_potential
+from TreeGravity import Octree
+import TreeGravity
+
+block_rows = TreeGravity.chunk_size  # Targets per task. Fixed, and lined up with the tree's own chunks, so that
+# every target is always summed the same way and results do not depend on the number of workers.
+
+worker_arrays = {}  # Shared arrays, as seen from inside a worker process.
+worker_settings = {}  # Force options, as seen from inside a worker process.
+worker_tree = {}  # Tree built by a worker for the current step.
+
+
+def share_array(array):  # Copies an array into a new shared memory block, returning the block and a view of it.
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+    shared[...] = array
+    return block, shared
+
+
+def attach_worker(specs, settings):  # Runs once in each worker, mapping the shared arrays into it.
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        worker_arrays[name] = (block, np.ndarray(shape, dtype=dtype, buffer=block.buf))
+    worker_settings.update(settings)
+
+
+def target_rows(step_id, n_targets, start, stop):  # Particles handled by one task.
+    pos = worker_arrays['pos'][1]
+    targets = np.arange(len(pos)) if n_targets < 0 else worker_arrays['targets'][1][:n_targets]
+    if worker_settings['solver'] != "tree":
+        return targets[start:stop]
+
+    if worker_tree.get('step') != step_id:  # Every worker builds the same tree from the shared positions.
+        sources = worker_arrays['sources'][1]
+        mass = worker_arrays['mass'][1]
+        tree = Octree(pos[sources], mass[sources], worker_settings['leaf_size'], worker_settings['quadrupole'])
+        worker_tree.update(step=step_id, tree=tree, order=targets[tree.target_order(pos[targets])])
+    return worker_tree['order'][start:stop]
+
+
+def evaluate_block(task):  # Adds the newtonian and halo forces on one block of targets into the shared arrays.
+    step_id, n_targets, start, stop = task
+    pos = worker_arrays['pos'][1]
+    mass = worker_arrays['mass'][1]
+    acc = worker_arrays['acc'][1]
+    sources = worker_arrays['sources'][1]
+    phi = worker_arrays['phi'][1] if 'phi' in worker_arrays else None
+    settings = worker_settings
+
+    rows = target_rows(step_id, n_targets, start, stop)
+    a = acc[rows]
+    energy = phi is not None and n_targets < 0  # Energies are only found when every particle is a target.
+
+    if settings['solver'] == "direct":
+        a += direct_acceleration(pos[rows], pos[sources], mass[sources], settings['soft'])
+        if energy:
+            phi[0, rows] = direct_potential(pos[rows], pos[sources], mass[sources])
+    elif settings['solver'] == "tree":
+        a_tree, phi_tree = worker_tree['tree'].walk(pos[rows], settings['theta'], settings['soft'], energy)
+        a += a_tree
+        if energy:
+            phi[0, rows] = phi_tree
+
+    for i, (halo, centre) in enumerate(settings['halos']):
+        a += halo.acceleration(pos[rows], pos[centre])
+        if energy:
+            phi[i + 1, rows] = halo.potential(pos[rows], pos[centre])
+
+    acc[rows] = a
+
+
+class ForcePool:
+    def __init__(self, particles, workers, settings):
+        self.particles = particles
+        self.settings = settings  # Solver, softening, tree options and (halo, centre index) pairs.
+        self.step_id = 0
+        self.blocks = []
+
+        particles.pos = self.share('pos', particles.pos)  # The particle store now lives in shared memory, and is
+        particles.mass = self.share('mass', particles.mass)  # only ever updated in place.
+        particles.acc = self.share('acc', particles.acc)
+        self.share('sources', particles.source_index)
+        self.targets = self.share('targets', np.zeros(len(particles), dtype=np.int64))
+        if settings['energy']:
+            self.phi = self.share('phi', np.zeros((1 + len(settings['halos']), len(particles))))
+
+        specs = {name: (block.name, array.shape, array.dtype) for name, block, array in self.blocks}
+        self.pool = Pool(workers, initializer=attach_worker, initargs=(specs, settings))
+
+    def share(self, name, array):
+        block, shared = share_array(array)
+        self.blocks.append((name, block, shared))
+        return shared
+
+    def evaluate(self, total_energies, targets=None):  # Newtonian and halo forces, split across the workers.
+        self.step_id += 1
+        if targets is None:
+            n = len(self.particles)
+            n_targets = -1
+        else:
+            n = n_targets = len(targets)
+            self.targets[:n] = targets
+        tasks = [(self.step_id, n_targets, start, min(start + block_rows, n)) for start in range(0, n, block_rows)]
+        self.pool.map(evaluate_block, tasks)
+
+        if self.settings['energy'] and targets is None:  # Summed here exactly as the single process sums them.
+            mass = self.particles.mass
+            if self.settings['solver'] in ("direct", "tree"):
+                total_energies[1] += np.sum(self.phi[0] * (mass / 2))
+            for i in range(len(self.settings['halos'])):
+                total_energies[1] += np.sum(self.phi[i + 1] * (mass / 2))
+
+    def close(self):  # Moves the particle store back into ordinary memory and frees the shared blocks.
+        self.pool.close()
+        self.pool.join()
+        self.particles.pos = np.array(self.particles.pos)
+        self.particles.mass = np.array(self.particles.mass)
+        self.particles.acc = np.array(self.particles.acc)
+        for name, block, array in self.blocks:
+            del array
+            block.close()
+            block.unlink()
+        self.blocks = []
@@ -0,0 +1,116 @@
+import numpy as np
+from Components import ComponentTable
+
+
+class ParticleSet(ComponentTable):
+    def __init__(self, n, type_names, type_colours):
+        self.pos = np.zeros((n, 3))  # Array of x, y and z positions of every particle.
+        self.vel = np.zeros((n, 3))  # Array of x, y and z velocities of every particle.
+        self.acc = np.zeros((n, 3))  # Array of x, y and z accelerations of every particle.
+        self.mass = np.zeros(n)  # Mass of every particle.
+        self.type = np.zeros(n, dtype=np.int16)  # Galaxy/component type code of every particle.
+        self.pid = np.arange(n, dtype=np.int64)  # Unique ID of every particle.
+        self.type_names = list(type_names)  # Name of each type code, e.g. the galaxy or disk name.
+        self.type_colours = list(type_colours)  # Colour of each type code on images.
+        self.source_index = np.arange(n)  # Particles that exert a gravitational force on others.
+        self.tracer_index = np.arange(0)  # Massless test particles, that only feel forces.
+        self.level = np.zeros(n, dtype=np.int64)  # Block step level of every particle, stepping by time_step / 2 ** level.
+        self.component_index = None  # Particles of each type code, found when first needed.
+
+    def __len__(self):
+        return len(self.mass)
+
+    @classmethod
+    def from_bodies(cls, bodies, type_names, type_colours):  # Bodies can also be blocks of many particles.
+        particles = cls(sum(len(body) if isinstance(body, ParticleBlock) else 1 for body in bodies), type_names,
+                        type_colours)
+        i = 0
+        for body in bodies:
+            if isinstance(body, ParticleBlock):
+                rows = slice(i, i + len(body))
+                particles.pos[rows] = body.pos
+                particles.vel[rows] = body.vel
+                particles.mass[rows] = body.mass
+                particles.type[rows] = particles.type_code(body.name, body.colour)
+                i += len(body)
+            else:
+                particles.pos[i] = body.xyz
+                particles.vel[i] = body.v_xyz
+                particles.mass[i] = body.m
+                particles.type[i] = particles.type_code(body.name, body.colour)
+                i += 1
+        particles.index_components()
+        return particles
+
+    def type_code(self, name, colour=''):  # Returns the type code of a name, adding it to the table if it is new.
+        if name not in self.type_names:
+            self.type_names.append(name)
+            self.type_colours.append(colour)
+            self.index_components()
+        return self.type_names.index(name)
+
+    def set_tracers(self, tracer):  # Splits the particles into sources and tracers, from a boolean tracer mask.
+        self.source_index = np.flatnonzero(~tracer)
+        self.tracer_index = np.flatnonzero(tracer)
+
+    def views(self):
+        return ParticleViews(self)
+
+
+class ParticleBlock:  # Many particles of one type, made as arrays and copied into the particle store in one go.
+    def __init__(self, name, mass, pos, vel, colour):
+        self.name = name
+        self.mass = mass  # Mass of every particle in the block.
+        self.pos = pos  # (N,3) array of positions.
+        self.vel = vel  # (N,3) array of velocities.
+        self.colour = colour
+
+    def __len__(self):
+        return len(self.mass)
+
+
+class ParticleViews:  # List-like stand-in for the old list of Bodies, making each view only when it is used.
+    def __init__(self, particles):
+        self.particles = particles
+
+    def __len__(self):
+        return len(self.particles)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [ParticleView(self.particles, k) for k in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("particle index out of range")
+        return ParticleView(self.particles, i)
+
+
+class ParticleView:  # Thin compatibility view giving the old Body attributes of one particle in a ParticleSet.
+    def __init__(self, particles, index):
+        self.particles = particles
+        self.index = index
+
+    @property
+    def name(self):
+        return self.particles.name(self.index)
+
+    @property
+    def m(self):
+        return self.particles.mass[self.index]
+
+    @property
+    def xyz(self):
+        return self.particles.pos[self.index]
+
+    @property
+    def v_xyz(self):
+        return self.particles.vel[self.index]
+
+    @property
+    def a_xyz(self):
+        return self.particles.acc[self.index]
+
+    @property
+    def colour(self):
+        return self.particles.colour(self.index)
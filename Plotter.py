@@ -3,8 +3,9 @@ import numpy as np
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 from IntData import *
+from Snapshots import read_image
 
-names = []
+galaxies = {}  # Position of each galaxy centre in the frame read in.
 x = []
 y = []  # x, y and z coordinates of particle being plotted.
 z = []
@@ -85,13 +86,8 @@ def path_copy():
         SecGal2[2].append(SecGal[2][i])
 
 
-def find_galaxy(galaxy_name):  # Finds position of a galaxy in the list of bodies.
-    position = 0
-    for i in range(len(names)):
-        if names[i] == galaxy_name:
-            position = i
-            break
-    return position
+def find_galaxy(galaxy_name):  # Position of a galaxy, from the type codes of the frame read in.
+    return galaxies.get(galaxy_name, 0)
 
 
 def centring_mid():  # Centres the path in the images of the interaction to a central point of the two galaxies.
@@ -203,19 +199,13 @@ def centring_sec_origin():  # A function to keep the secondary galaxy at the ori
 
 
 def point_read(title):  # Reads information about all particles in the simulation.
-    if rewind:
-        file = open("Backwards/rimage_%.5f.txt" % title)
-    else:
-        file = open("Forwards/image_%.5f.txt" % title)
+    frame = read_image(title, Gyr, rewind, snapshot_format)
 
-    for line in file:  # Reads the file line by line.
-        data = line.strip().split()
-        if data[0] == pri_galaxy_name or sec_galaxy_name or pri_disk_name or sec_disk_name:
-            names.append(data[0])
-            x.append(float(data[2]))
-            y.append(float(data[3]))  # Appends each x, y and z value to list to be plotted later.
-            z.append(float(data[4]))
-            colour.append(data[8])  # Appends colour of each particle to be plotted later.
+    galaxies.update({name: frame.index_of(name) for name in (pri_galaxy_name, sec_galaxy_name)})
+    x.extend(frame.pos[:, 0].tolist())
+    y.extend(frame.pos[:, 1].tolist())  # Appends each x, y and z value to list to be plotted later.
+    z.extend(frame.pos[:, 2].tolist())
+    colour.extend(frame.colours())  # Appends colour of each particle to be plotted later.
 
     centring_choice()
 
@@ -0,0 +1,304 @@
+import json
+import os
+import queue
+import threading
+from collections import OrderedDict
+import numpy as np
+from Components import ComponentTable
+
+magic = b"NBSNAP01"  # First bytes of every snapshot file, with the format version.
+frame_dtype = np.dtype([('time', '<f8'), ('step', '<i8'), ('n', '<i8')])  # Header at the start of each frame.
+column_dtypes = [('id', np.dtype('<i8'), ()), ('type', np.dtype('<i2'), ()), ('mass', np.dtype('<f8'), ()),
+                 ('pos', np.dtype('<f8'), (3,)), ('vel', np.dtype('<f8'), (3,))]  # Columns of every frame, in order.
+units = {'length': "m", 'mass': "kg", 'velocity': "m/s", 'time': "s"}  # Units of every stored value.
+frame_cache_size = 8  # Number of recently used frames each series keeps open.
+open_series = {}  # Series opened so far in this process, by file name, so every script shares their frame caches.
+
+
+def padded(size):  # Rounds a number of bytes up to a multiple of 8, so that every column starts aligned.
+    return (size + 7) // 8 * 8
+
+
+def frame_layout(n):  # Offset of each column from the start of a frame of n particles, and the frame's size.
+    offset = padded(frame_dtype.itemsize)
+    layout = {}
+    for name, dtype, shape in column_dtypes:
+        layout[name] = (offset, dtype, (n,) + shape)
+        offset += padded(dtype.itemsize * n * int(np.prod(shape)))
+    return layout, offset
+
+
+def snapshot_file_name(backwards=False):
+    if backwards:
+        return "Backwards/RewindSnapshots.nbs"
+    return "Forwards/Snapshots.nbs"
+
+
+def image_file_name(title, backwards=False):  # Text image of one frame, titled by its time in Gyrs.
+    if backwards:
+        return "Backwards/rimage_%.5f.txt" % title
+    return "Forwards/image_%.5f.txt" % title
+
+
+class SnapshotWriter:
+    def __init__(self, file_name, particles, time_step=0.0, resume_step=None, parameters=None):  # Parameters, if
+        # given, are kept in the header, e.g. the options a file of generated particles was made from.
+        if resume_step is not None:  # Frames after the step a run is resumed from are cut off and written again.
+            index = SnapshotFile(file_name)
+            kept = sum(1 for step in index.steps if step <= resume_step)
+            end = index.frames_start if kept == 0 else index.offsets[kept - 1] + frame_layout(index.counts[kept - 1])[1]
+            self.file = open(file_name, "r+b")
+            self.file.truncate(end)
+            self.file.seek(end)
+            return
+
+        header = {'version': 1, 'units': units, 'time_step': time_step,
+                  'columns': [name for name, dtype, shape in column_dtypes],
+                  'components': [{'code': code, 'name': name, 'colour': colour} for code, (name, colour) in
+                                 enumerate(zip(particles.type_names, particles.type_colours))]}
+        if parameters is not None:
+            header['parameters'] = parameters
+        text = json.dumps(header).encode()
+        text += b" " * (padded(len(text)) - len(text))
+
+        self.file = open(file_name, "wb")
+        self.file.write(magic)
+        self.file.write(np.array([len(text)], dtype='<i8').tobytes())
+        self.file.write(text)
+
+    def write(self, particles, time, step):  # Each column goes straight to the file, without building the frame.
+        header = np.array([(time, step, len(particles))], dtype=frame_dtype)
+        self.file.write(header.tobytes())
+        self.file.write(bytes(padded(header.nbytes) - header.nbytes))
+
+        columns = {'id': particles.pid, 'type': particles.type, 'mass': particles.mass, 'pos': particles.pos,
+                   'vel': particles.vel}
+        for name, dtype, shape in column_dtypes:
+            data = np.ascontiguousarray(columns[name], dtype=dtype)
+            self.file.write(data.reshape(-1).view(np.uint8))
+            self.file.write(bytes(padded(data.nbytes) - data.nbytes))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class Frame(ComponentTable):  # One snapshot of every particle, with the component table needed to name them.
+    def __init__(self, time, step, columns, type_names, type_colours):
+        self.time = time  # Time of the frame in seconds.
+        self.step = step
+        self.pid = columns['id']
+        self.type = columns['type']
+        self.mass = columns['mass']
+        self.pos = columns['pos']
+        self.vel = columns['vel']
+        self.type_names = type_names
+        self.type_colours = type_colours
+        self.component_index = None
+
+    def __len__(self):
+        return len(self.mass)
+
+    def names(self):
+        return [self.type_names[code] for code in self.type]
+
+    def colours(self):
+        return [self.type_colours[code] for code in self.type]
+
+
+def copy_frame(particles, time, step):  # Frame holding copies of the particle arrays, safe to write while stepping.
+    columns = {'id': particles.pid.copy(), 'type': particles.type.copy(), 'mass': particles.mass.copy(),
+               'pos': particles.pos.copy(), 'vel': particles.vel.copy()}
+    return Frame(time, step, columns, list(particles.type_names), list(particles.type_colours))
+
+
+class BackgroundWriter:  # Writes frames on a separate thread, so the integrator does not wait for the disk.
+    def __init__(self, write, queue_size=4, timeout=60.0):
+        self.write = write  # Function called with each frame, its time and its step.
+        self.queue = queue.Queue(queue_size)  # Frames waiting to be written. Bounded, so memory cannot run away.
+        self.timeout = timeout  # Seconds to wait for room in the queue before giving up.
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            if self.error is None:  # After a failure, frames are only taken off the queue so nothing blocks.
+                try:
+                    self.write(*item)
+                except BaseException as error:
+                    self.error = error
+            self.queue.task_done()
+
+    def check(self):
+        if self.error is not None:
+            raise RuntimeError("The snapshot writer failed.") from self.error
+
+    def put(self, frame):
+        self.check()
+        try:
+            self.queue.put((frame, frame.time, frame.step), timeout=self.timeout)
+        except queue.Full:
+            raise RuntimeError("The snapshot writer is %d frames behind and has not caught up within %g seconds."
+                               % (self.queue.maxsize, self.timeout)) from None
+
+    def wait(self):  # Waits until every frame queued so far has been written.
+        self.queue.join()
+        self.check()
+
+    def close(self):  # Waits for every queued frame to be written.
+        self.queue.put(None)
+        self.thread.join()
+        self.check()
+
+
+class SnapshotFile:  # Header and frame index of a snapshot file.
+    def __init__(self, file_name):
+        self.file_name = file_name
+        file = open(file_name, "rb")
+        if file.read(len(magic)) != magic:
+            file.close()
+            raise ValueError("%s is not a snapshot file." % file_name)
+        length = int(np.frombuffer(file.read(8), dtype='<i8')[0])
+        self.header = json.loads(file.read(length).decode())
+        self.type_names = [component['name'] for component in self.header['components']]
+        self.type_colours = [component['colour'] for component in self.header['components']]
+
+        self.offsets = []  # Start of each frame in the file.
+        self.times = []
+        self.steps = []
+        self.counts = []
+        offset = len(magic) + 8 + length
+        self.frames_start = offset  # Start of the first frame, just after the header.
+        file.seek(0, 2)
+        end = file.tell()
+        while offset + frame_dtype.itemsize <= end:
+            file.seek(offset)
+            time, step, n = np.frombuffer(file.read(frame_dtype.itemsize), dtype=frame_dtype)[0]
+            layout, size = frame_layout(int(n))
+            if offset + size > end:  # A frame still being written is left out.
+                break
+            self.offsets.append(offset)
+            self.times.append(float(time))
+            self.steps.append(int(step))
+            self.counts.append(int(n))
+            offset += size
+        file.close()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def find_time(self, title, unit=1.0):  # Number of the frame whose time, in the given unit, rounds to title.
+        gaps = np.abs(np.array(self.times) / unit - title)
+        if len(gaps) == 0 or np.min(gaps) >= 5e-6:  # Titles are only ever given to five decimal places.
+            raise KeyError("No frame at time %.5f in %s." % (title, self.file_name))
+        return int(np.argmin(gaps))
+
+    def find_step(self, step):
+        if step not in self.steps:
+            raise KeyError("No frame at step %d in %s." % (step, self.file_name))
+        return self.steps.index(step)
+
+
+def read_text_image(file_name):  # Reads a text image into a Frame, so both formats are used the same way.
+    names = []
+    colours = []
+    values = []
+    file = open(file_name, "r")
+    for line in file:
+        data = line.strip().split()
+        names.append(data[0])
+        values.append([float(value) for value in data[1:8]])
+        colours.append(data[8] if len(data) > 8 else '')
+    file.close()
+
+    type_names = []
+    type_colours = []
+    codes = []
+    for name, colour in zip(names, colours):
+        if name not in type_names:
+            type_names.append(name)
+            type_colours.append(colour)
+        codes.append(type_names.index(name))
+
+    values = np.array(values).reshape(-1, 7)
+    columns = {'id': np.arange(len(names), dtype=np.int64), 'type': np.array(codes, dtype=np.int16),
+               'mass': values[:, 0], 'pos': values[:, 1:4], 'vel': values[:, 4:7]}
+    return Frame(0.0, 0, columns, type_names, type_colours)
+
+
+class SnapshotSeries:  # A run's snapshot file, opened once, with frames mapped from the file only when used.
+    def __init__(self, file_name, cache_size=frame_cache_size):
+        self.file_name = file_name
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # Recently used frames, least recently used first.
+        self.index = SnapshotFile(file_name)
+
+    def __len__(self):
+        return len(self.index)
+
+    def refresh(self):  # Indexes frames added to the file since it was opened, as when a simulation is running.
+        self.index = SnapshotFile(self.file_name)
+
+    def times(self):
+        return np.array(self.index.times)
+
+    def steps(self):
+        return np.array(self.index.steps)
+
+    def frame(self, k):
+        if k in self.cache:
+            self.cache.move_to_end(k)
+            return self.cache[k]
+
+        layout, size = frame_layout(self.index.counts[k])
+        columns = {}
+        for name, (offset, dtype, shape) in layout.items():
+            if self.index.counts[k] == 0:
+                columns[name] = np.empty(shape, dtype=dtype)
+            else:  # Read-only views, so nothing is read from disk until the column is used.
+                columns[name] = np.memmap(self.file_name, dtype=dtype, mode='r', offset=self.index.offsets[k] + offset,
+                                          shape=shape)
+        frame = Frame(self.index.times[k], self.index.steps[k], columns, self.index.type_names,
+                      self.index.type_colours)
+
+        self.cache[k] = frame
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return frame
+
+    def at_time(self, title, unit=1.0):  # Frame whose time, in the given unit, matches title.
+        try:
+            k = self.index.find_time(title, unit)
+        except KeyError:
+            self.refresh()
+            k = self.index.find_time(title, unit)
+        return self.frame(k)
+
+    def at_step(self, step):
+        try:
+            k = self.index.find_step(step)
+        except KeyError:
+            self.refresh()
+            k = self.index.find_step(step)
+        return self.frame(k)
+
+
+def snapshot_series(directory=".", backwards=False):  # The shared series of a run directory.
+    file_name = os.path.abspath(os.path.join(directory, snapshot_file_name(backwards)))
+    if file_name not in open_series:
+        open_series[file_name] = SnapshotSeries(file_name)
+    return open_series[file_name]
+
+
+def read_image(title, unit, backwards=False, file_format="binary"):  # The frame at time title, in the given unit.
+    if file_format == "binary":
+        return snapshot_series(".", backwards).at_time(title, unit)
+
+    frame = read_text_image(image_file_name(title, backwards))
+    frame.time = title * unit
+    return frame
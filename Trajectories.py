@@ -0,0 +1,49 @@
+import numpy as np
+
+
+class TrajectoryRecorder:
+    def __init__(self, index, n_steps, cadence=1, velocity_index=None):
+        self.index = np.asarray(index, dtype=np.int64)  # Particles whose paths are recorded.
+        self.velocity_index = self.index if velocity_index is None else np.asarray(velocity_index, dtype=np.int64)
+        self.cadence = cadence  # Number of steps between records.
+        self.slot = {int(i): k for k, i in enumerate(self.index)}  # Column of each recorded particle.
+        self.velocity_slot = {int(i): k for k, i in enumerate(self.velocity_index)}
+
+        n_records = (n_steps - 1) // cadence + 1  # Steps 0 to n_steps - 1 are recorded, as before.
+        self.pos = np.empty((n_records, len(self.index), 3))  # Buffers are allocated once, so memory does not grow
+        self.vel = np.empty((n_records, len(self.velocity_index), 3))  # as the simulation runs.
+        self.steps = np.arange(n_records) * cadence  # Step of each record.
+        self.n_pos = 0
+        self.n_vel = 0
+
+    def record_positions(self, particles, step):
+        if step % self.cadence == 0 and step // self.cadence < len(self.steps):
+            self.pos[step // self.cadence] = particles.pos[self.index]
+            self.n_pos = step // self.cadence + 1
+
+    def record_velocities(self, particles, step):
+        if step % self.cadence == 0 and step // self.cadence < len(self.steps):
+            self.vel[step // self.cadence] = particles.vel[self.velocity_index]
+            self.n_vel = step // self.cadence + 1
+
+    def positions(self, i):  # Recorded path of particle i, one row per record.
+        return self.pos[:self.n_pos, self.slot[i]]
+
+    def velocities(self, i):
+        return self.vel[:self.n_vel, self.velocity_slot[i]]
+
+    def recorded_steps(self):
+        return self.steps[:self.n_pos]
+
+    def save(self, file_name, particles):  # Writes every recorded path, with the ID and type of each particle.
+        np.savez(file_name, steps=self.recorded_steps(), pid=particles.pid[self.index],
+                 type=particles.type[self.index], pos=self.pos[:self.n_pos])
+
+    def checkpoint(self):  # Recorded part of the buffers, to be saved with a checkpoint.
+        return {'recorder_pos': self.pos[:self.n_pos], 'recorder_vel': self.vel[:self.n_vel]}
+
+    def restore(self, arrays):  # Refills the buffers from a checkpoint.
+        self.n_pos = len(arrays['recorder_pos'])
+        self.n_vel = len(arrays['recorder_vel'])
+        self.pos[:self.n_pos] = arrays['recorder_pos']
+        self.vel[:self.n_vel] = arrays['recorder_vel']
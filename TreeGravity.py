@@ -0,0 +1,272 @@
+import numpy as np
+from IntData import G
+
+max_level = 21  # Deepest level of the tree, set by the 21 bits per axis that fit in a 64 bit Morton key.
+chunk_size = 4096  # Number of targets walked through the tree at once.
+group_size = 64  # Number of neighbouring targets that share one walk through the tree, and one interaction list.
+block_size = 2 ** 18  # Largest number of target and source pairs summed together, as one dense block.
+
+
+def spread_bits(cells):  # Spreads the lowest 21 bits of each integer so that two zero bits sit between each.
+    x = cells.astype(np.uint64) & np.uint64(0x1fffff)
+    x = (x | (x << np.uint64(32))) & np.uint64(0x1f00000000ffff)
+    x = (x | (x << np.uint64(16))) & np.uint64(0x1f0000ff0000ff)
+    x = (x | (x << np.uint64(8))) & np.uint64(0x100f00f00f00f00f)
+    x = (x | (x << np.uint64(4))) & np.uint64(0x10c30c30c30c30c3)
+    x = (x | (x << np.uint64(2))) & np.uint64(0x1249249249249249)
+    return x
+
+
+def morton_keys(cells):  # Interleaves the x, y and z cell numbers of each particle into one key.
+    return spread_bits(cells[:, 0]) | (spread_bits(cells[:, 1]) << np.uint64(1)) | \
+        (spread_bits(cells[:, 2]) << np.uint64(2))
+
+
+def segment_sum(values, starts, ends):  # Sums values over each [start, end) range of the first axis.
+    padded = np.concatenate([values, np.zeros((1,) + values.shape[1:])])
+    bounds = np.empty(2 * len(starts), dtype=np.int64)
+    bounds[0::2] = starts
+    bounds[1::2] = ends
+    return np.add.reduceat(padded, bounds, axis=0)[0::2]
+
+
+def ragged_arange(starts, counts):  # Concatenation of arange(start, start + count) for every pair.
+    offsets = np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(starts, counts) + (np.arange(np.sum(counts)) - offsets)
+
+
+class Octree:
+    def __init__(self, pos, mass, leaf_size=16, quadrupole=False):
+        self.quadrupole = quadrupole  # Option to carry quadrupole moments as well as monopoles.
+
+        lo = pos.min(axis=0)
+        self.box_size = max(np.max(pos.max(axis=0) - lo), 1.0) * (1 + 1e-9)  # Side of the cube around all sources.
+        self.corner = lo
+
+        cells = np.minimum(((pos - lo) / self.box_size * (2 ** max_level)).astype(np.int64), 2 ** max_level - 1)
+        keys = morton_keys(cells)
+        self.order = np.argsort(keys, kind='stable')  # Source order along the Morton curve.
+        keys = keys[self.order]
+        self.pos = pos[self.order]
+        self.mass = mass[self.order]
+
+        self.build_nodes(keys, leaf_size)
+        self.find_moments()
+
+    def build_nodes(self, keys, leaf_size):
+        n = len(keys)
+        starts = [np.array([0])]
+        counts = [np.array([n])]
+        levels = [np.array([0])]
+        first_child = []
+        child_count = []
+
+        level_starts = np.array([0])  # Starts of every cell at the previous level, in or out of the tree.
+        level_ids = np.array([0])  # Node number of each of those cells, or -1 if not in the tree.
+        next_id = 1
+
+        for level in range(1, max_level + 1):
+            parents = level_ids[level_ids >= 0]
+            parent_open = counts[-1] > leaf_size
+            if not np.any(parent_open):
+                first_child.append(np.full(len(parents), -1))
+                child_count.append(np.zeros(len(parents), dtype=np.int64))
+                break
+
+            prefix = keys >> np.uint64(3 * (max_level - level))
+            cell_starts = np.concatenate([[0], np.flatnonzero(np.diff(prefix)) + 1])
+            cell_ends = np.append(cell_starts[1:], n)
+            parent_cell = np.searchsorted(level_starts, cell_starts, side='right') - 1
+            parent_node = level_ids[parent_cell]
+
+            open_ids = np.zeros(next_id, dtype=bool)
+            open_ids[parents[parent_open]] = True
+            in_tree = (parent_node >= 0) & open_ids[np.maximum(parent_node, 0)]
+
+            new_ids = np.full(len(cell_starts), -1)
+            new_ids[in_tree] = next_id + np.arange(np.sum(in_tree))
+
+            children_of = parent_node[in_tree]
+            parent_rank = np.searchsorted(parents, children_of)
+            n_children = np.bincount(parent_rank, minlength=len(parents))
+            has_children = n_children > 0
+            firsts = np.full(len(parents), -1)
+            firsts[has_children] = new_ids[in_tree][(np.cumsum(n_children) - n_children)[has_children]]
+            first_child.append(firsts)
+            child_count.append(n_children)
+
+            starts.append(cell_starts[in_tree])
+            counts.append(cell_ends[in_tree] - cell_starts[in_tree])
+            levels.append(np.full(np.sum(in_tree), level))
+            next_id += np.sum(in_tree)
+
+            level_starts = cell_starts
+            level_ids = new_ids
+        else:
+            first_child.append(np.full(len(starts[-1]), -1))
+            child_count.append(np.zeros(len(starts[-1]), dtype=np.int64))
+
+        self.node_start = np.concatenate(starts)  # First sorted source in each node.
+        self.node_count = np.concatenate(counts)  # Number of sources in each node.
+        self.node_level = np.concatenate(levels)  # Depth of each node, with the root at zero.
+        self.first_child = np.concatenate(first_child)  # Node number of each node's first child, -1 for leaves.
+        self.child_count = np.concatenate(child_count)  # Number of children of each node.
+        self.is_leaf = self.child_count == 0
+
+    def find_moments(self):
+        node_end = self.node_start + self.node_count
+        self.node_mass = segment_sum(self.mass, self.node_start, node_end)
+        safe_mass = np.where(self.node_mass > 0, self.node_mass, 1)
+        self.node_com = segment_sum(self.mass[:, np.newaxis] * self.pos, self.node_start, node_end) / \
+            safe_mass[:, np.newaxis]
+
+        self.node_size = self.box_size / (2.0 ** self.node_level)  # Side of each node's cube.
+        cell = np.floor((self.pos[self.node_start] - self.corner) / self.node_size[:, np.newaxis])
+        centre = self.corner + (cell + 0.5) * self.node_size[:, np.newaxis]
+        self.node_offset = np.sqrt(np.sum((self.node_com - centre) ** 2, axis=1))  # Distance of com from centre.
+
+        if self.quadrupole:
+            d = self.pos - self.corner
+            com = self.node_com - self.corner
+            second = segment_sum(self.mass[:, np.newaxis, np.newaxis] * d[:, :, np.newaxis] * d[:, np.newaxis, :],
+                                 self.node_start, node_end)
+            second -= self.node_mass[:, np.newaxis, np.newaxis] * com[:, :, np.newaxis] * com[:, np.newaxis, :]
+            trace = np.trace(second, axis1=1, axis2=2)
+            self.node_quad = 3 * second - trace[:, np.newaxis, np.newaxis] * np.eye(3)  # Traceless quadrupole.
+
+    def acceleration(self, target_pos, theta=0.5, soft=0.0, potential=False):  # Tree force on every target.
+        acc = np.zeros_like(target_pos)
+        phi = np.zeros(len(target_pos))
+        if len(self.mass) == 0:
+            return acc, phi
+
+        order = self.target_order(target_pos)
+        for start in range(0, len(target_pos), chunk_size):
+            chunk = order[start:start + chunk_size]
+            acc[chunk], phi[chunk] = self.walk(target_pos[chunk], theta, soft, potential)
+
+        return acc, phi
+
+    def target_order(self, target_pos):  # Orders targets along the Morton curve, so nearby targets share a group.
+        cells = np.clip((target_pos - self.corner) / self.box_size * (2 ** max_level), 0,  # Clipped before the cast,
+                        2 ** max_level - 1).astype(np.int64)  # as targets far outside the tree would overflow it.
+        return np.argsort(morton_keys(cells), kind='stable')
+
+    def walk(self, target_pos, theta, soft, potential):  # Walks groups of neighbouring targets down the tree together.
+        n = len(target_pos)  # Each group is given one list of the nodes and leaf sources it feels, which is then
+        n_groups = -(-n // group_size)  # summed over all of its targets at once.
+        group_starts = np.arange(n_groups) * group_size
+        group_lo = np.minimum.reduceat(target_pos, group_starts, axis=0)
+        group_hi = np.maximum.reduceat(target_pos, group_starts, axis=0)
+
+        group = np.arange(n_groups)  # Group and node of every pair still to be looked at.
+        node = np.zeros(n_groups, dtype=np.int64)
+        node_pairs = []  # Groups and the nodes accepted as points for them.
+        leaf_pairs = []  # Groups and the leaves opened for them.
+
+        while len(group) > 0:
+            com = self.node_com[node]
+            gap = np.maximum(np.maximum(group_lo[group] - com, com - group_hi[group]), 0)
+            distance = np.sqrt(np.sum(gap ** 2, axis=1))  # Distance from the node's com to the group's box.
+
+            accept = distance > (self.node_size[node] / theta) + self.node_offset[node]  # Node is a point to all.
+            node_pairs.append((group[accept], node[accept]))
+            leaf = ~accept & self.is_leaf[node]
+            leaf_pairs.append((group[leaf], node[leaf]))
+
+            opened = ~accept & ~self.is_leaf[node]
+            counts = self.child_count[node[opened]]
+            group = np.repeat(group[opened], counts)
+            node = ragged_arange(self.first_child[node[opened]], counts)
+
+        node_group, node = [np.concatenate(arrays) for arrays in zip(*node_pairs)]
+        leaf_group, leaf = [np.concatenate(arrays) for arrays in zip(*leaf_pairs)]
+
+        padded = np.zeros((n_groups * group_size, 3))  # Every group filled to group_size. The targets added to fill
+        padded[:n] = target_pos  # the last group are summed, then thrown away.
+        padded[n:] = target_pos[-1]
+        padded = padded.reshape(n_groups, group_size, 3)
+
+        counts = self.node_count[leaf]
+        list_group = np.repeat(leaf_group, counts)
+        source = ragged_arange(self.node_start[leaf], counts)
+        list_pos, list_mass = self.pos[source], self.mass[source]
+        acc = np.zeros((n_groups, group_size, 3))
+        phi = np.zeros((n_groups, group_size))
+
+        # Nodes are summed as though they were sources at their centres of mass, along with the leaf sources.
+        list_group = np.concatenate([node_group, list_group])
+        list_pos = np.concatenate([self.node_com[node], list_pos])
+        list_mass = np.concatenate([self.node_mass[node], list_mass])
+        add_lists(acc, phi, padded, list_group, list_pos, list_mass, soft, potential)
+        if self.quadrupole:
+            self.add_quadrupoles(acc, phi, padded, node_group, node, potential)
+
+        return acc.reshape(-1, 3)[:n], phi.reshape(-1)[:n]
+
+    def add_quadrupoles(self, acc, phi, padded, group, node, potential):  # Quadrupole forces of nodes on every
+        order = np.argsort(group, kind='stable')  # target of the groups they were accepted for.
+        group, node = group[order], node[order]
+        pairs = max(1, block_size // group_size)
+        for start in range(0, len(group), pairs):
+            g, k = group[start:start + pairs], node[start:start + pairs]
+            d = [padded[g, :, i] - self.node_com[k, i, np.newaxis] for i in range(3)]  # Each (pairs, group_size).
+            r2 = (d[0] ** 2) + (d[1] ** 2) + (d[2] ** 2)
+            over_r5 = 1 / (r2 * r2 * np.sqrt(r2))
+
+            q = self.node_quad[k]  # Each component is summed on its own, as small products of matrices are slow.
+            qd = [(q[:, i, 0, np.newaxis] * d[0]) + (q[:, i, 1, np.newaxis] * d[1]) + (q[:, i, 2, np.newaxis] * d[2])
+                  for i in range(3)]
+            dqd_over_r5 = ((d[0] * qd[0]) + (d[1] * qd[1]) + (d[2] * qd[2])) * over_r5
+
+            firsts = np.concatenate([[0], np.flatnonzero(np.diff(g)) + 1])  # Pairs of each group lie together.
+            for i in range(3):
+                a = G * ((qd[i] * over_r5) - (2.5 * dqd_over_r5 / r2) * d[i])
+                acc[g[firsts], :, i] += np.add.reduceat(a, firsts, axis=0)
+            if potential:
+                phi[g[firsts]] += np.add.reduceat(- 0.5 * G * dqd_over_r5, firsts, axis=0)
+
+
+def add_lists(acc, phi, padded, group, pos, mass, soft, potential):  # Forces of each group's list of sources on every
+    # target of the group. Groups are taken in order of the length of their lists, so groups of about the same length
+    # are summed together, each list filled to the longest with massless sources. Positions are taken from the centre
+    # of each group, so the force, found as sum(w * (target - source)) = target * sum(w) - sum(w * source) with one
+    # matrix product for the second sum, loses no more than the ratio of the group's size to the distance.
+    if len(mass) == 0:
+        return
+    n_groups = len(padded)
+    order = np.argsort(group, kind='stable')
+    pos, mass = np.ascontiguousarray(pos[order].T), mass[order]
+    lengths = np.bincount(group, minlength=n_groups)
+    firsts = np.cumsum(lengths) - lengths
+    centres = (padded.min(axis=1) + padded.max(axis=1)) / 2
+
+    by_length = np.argsort(lengths)[::-1]
+    start = 0
+    while start < n_groups:
+        longest = max(lengths[by_length[start]], 1)
+        groups = by_length[start:start + max(1, block_size // (group_size * longest))]
+        start += len(groups)
+
+        slots = np.arange(longest)
+        index = np.minimum(firsts[groups][:, np.newaxis] + slots, len(mass) - 1)
+        m = np.where(slots < lengths[groups][:, np.newaxis], mass[index], 0)[:, np.newaxis, :]
+        t = padded[groups] - centres[groups][:, np.newaxis, :]
+        s = np.stack([pos[i][index] - centres[groups, i][:, np.newaxis] for i in range(3)], axis=2)
+
+        d = t[:, :, np.newaxis, 0] - s[:, np.newaxis, :, 0]
+        r2 = d * d
+        for i in (1, 2):
+            np.subtract(t[:, :, np.newaxis, i], s[:, np.newaxis, :, i], out=d)
+            d *= d
+            r2 += d
+        r2[r2 == 0] = np.inf  # A source exerts no force on itself, or on a target sitting on it.
+        r = np.sqrt(r2)
+
+        if potential:
+            phi[groups] -= G * np.sum(m / r, axis=2)
+        if soft > 0:
+            r2 += soft ** 2
+        r2 *= r
+        w = np.divide(m, r2, out=r2)
+        acc[groups] -= G * (t * np.sum(w, axis=2)[:, :, np.newaxis] - np.matmul(w, s))